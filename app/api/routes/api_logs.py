@@ -1,3 +1,4 @@
+from bson import ObjectId
 from fastapi import APIRouter, HTTPException
 from typing import List
 from app.schemas.api_log import ApiLogResponse
@@ -14,7 +15,8 @@ async def get_all_api_logs(skip: int = 0, limit: int = 100):
     """Get all API logs"""
     try:
         results = await api_log_service.get_all(skip=skip, limit=limit)
-        return [ApiLogResponse(**log) for log in results]
+        # FastAPI validate dict theo response_model, không cần dựng model trước
+        return results
     except Exception as e:
         logger.error(f"Error getting API logs: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -23,11 +25,13 @@ async def get_all_api_logs(skip: int = 0, limit: int = 100):
 @router.get("/{log_id}", response_model=ApiLogResponse)
 async def get_api_log(log_id: str):
     """Get API log by ID"""
+    if not ObjectId.is_valid(log_id):
+        raise HTTPException(status_code=400, detail="Invalid API log id")
     try:
         log = await api_log_service.get_by_id(log_id)
         if not log:
             raise HTTPException(status_code=404, detail="API log not found")
-        return ApiLogResponse(**log)
+        return log
     except HTTPException:
         raise
     except Exception as e:
@@ -40,7 +44,7 @@ async def get_api_logs_by_path(path: str, skip: int = 0, limit: int = 100):
     """Get API logs by path"""
     try:
         results = await api_log_service.get_by_path(path, skip=skip, limit=limit)
-        return [ApiLogResponse(**log) for log in results]
+        return results
     except Exception as e:
         logger.error(f"Error getting API logs by path: {e}")
         raise HTTPException(status_code=500, detail=str(e))
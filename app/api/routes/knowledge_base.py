@@ -2,7 +2,8 @@
 API routes cho knowledge base: upload và quản lý documents.
 """
 import logging
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+import os
+from fastapi import APIRouter, Request, UploadFile, File, Form, HTTPException
 from typing import Optional
 from pydantic import BaseModel
 
@@ -12,6 +13,23 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Giới hạn kích thước file DOCX upload
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+# Phần dư cho multipart boundaries và các form fields khác trong Content-Length
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+# DOCX là file ZIP, luôn bắt đầu bằng local file header "PK\x03\x04"
+DOCX_MAGIC_BYTES = b"PK\x03\x04"
+
+
+def _get_upload_size(file: UploadFile) -> int:
+    """Kích thước file upload, không cần đọc nội dung vào memory."""
+    if file.size is not None:
+        return file.size
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
 
 class UploadDocxResponse(BaseModel):
     """Response model cho upload DOCX endpoint."""
@@ -26,6 +44,7 @@ class UploadDocxResponse(BaseModel):
 
 @router.post("/upload-docx", response_model=UploadDocxResponse)
 async def upload_docx_file(
+    request: Request,
     file: UploadFile = File(..., description="DOCX file to upload"),
     title: Optional[str] = Form(None, description="Title of the document"),
     description: Optional[str] = Form(None, description="Description of the document"),
@@ -40,6 +59,15 @@ async def upload_docx_file(
     Returns:
         UploadDocxResponse với thông tin document và chunks đã được lưu
     """
+    # Reject sớm theo Content-Length, trước khi xử lý file
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        if int(content_length) > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File is too large (max {MAX_UPLOAD_BYTES // (1024 * 1024)}MB)"
+            )
+    
     # Validate file type
     if not file.filename:
         raise HTTPException(status_code=400, detail="Filename is required")
@@ -51,17 +79,31 @@ async def upload_docx_file(
         )
     
     try:
-        # Read file content
-        file_content = await file.read()
+        # UploadFile đã được Starlette spool (memory/disk), dùng trực tiếp
+        # file object thay vì đọc toàn bộ nội dung vào bytes
+        file_size = _get_upload_size(file)
         
-        if not file_content:
+        if not file_size:
             raise HTTPException(status_code=400, detail="File is empty")
         
-        logger.info(f"Received DOCX upload: {file.filename} ({len(file_content)} bytes)")
+        if file_size > MAX_UPLOAD_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File is too large (max {MAX_UPLOAD_BYTES // (1024 * 1024)}MB)"
+            )
+        
+        # Kiểm tra magic bytes để loại file không phải DOCX (ZIP) ngay
+        file.file.seek(0)
+        header = file.file.read(len(DOCX_MAGIC_BYTES))
+        file.file.seek(0)
+        if header != DOCX_MAGIC_BYTES:
+            raise HTTPException(status_code=400, detail="File is not a valid .docx document")
+        
+        logger.info(f"Received DOCX upload: {file.filename} ({file_size} bytes)")
         
         # Process file: load -> convert markdown -> split -> embed -> save
         result = await process_and_save_docx_file(
-            file_content=file_content,
+            file_obj=file.file,
             filename=file.filename,
             source_id=source_id,
             title=title,
@@ -78,6 +120,8 @@ async def upload_docx_file(
             message=f"Successfully processed {result['chunk_count']} chunks from {file.filename}",
         )
         
+    except HTTPException:
+        raise
     except ValueError as e:
         logger.error(f"Validation error processing DOCX: {e}")
         raise HTTPException(status_code=400, detail=str(e))
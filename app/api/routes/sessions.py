@@ -1,3 +1,4 @@
+from bson import ObjectId
 from fastapi import APIRouter, HTTPException
 from typing import List
 from app.schemas.session import SessionResponse
@@ -14,7 +15,8 @@ async def get_all_sessions(skip: int = 0, limit: int = 100):
     """Get all chat sessions"""
     try:
         results = await chat_session_service.get_all(skip=skip, limit=limit)
-        return [SessionResponse(**session) for session in results]
+        # FastAPI validate dict theo response_model, không cần dựng model trước
+        return results
     except Exception as e:
         logger.error(f"Error getting sessions: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -23,11 +25,13 @@ async def get_all_sessions(skip: int = 0, limit: int = 100):
 @router.get("/{session_id}", response_model=SessionResponse)
 async def get_session_by_id(session_id: str):
     """Get session by document ID"""
+    if not ObjectId.is_valid(session_id):
+        raise HTTPException(status_code=400, detail="Invalid session id")
     try:
         session = await chat_session_service.get_by_id(session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
-        return SessionResponse(**session)
+        return session
     except HTTPException:
         raise
     except Exception as e:
@@ -42,7 +46,7 @@ async def get_session_by_session_id(session_id: str):
         session = await chat_session_service.get_by_session(session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
-        return SessionResponse(**session)
+        return session
     except HTTPException:
         raise
     except Exception as e:
@@ -1,4 +1,5 @@
-from pydantic_settings import BaseSettings
+from functools import lru_cache
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import Optional
 
 
@@ -9,6 +10,8 @@ class Settings(BaseSettings):
     # MongoDB
     mongodb_url: str
     mongodb_db_name: str
+    mongodb_max_pool_size: int = 200
+    mongodb_min_pool_size: int = 20
     
     # SQL Database (for text2sql)
     postgres_host: Optional[str] = None
@@ -23,6 +26,27 @@ class Settings(BaseSettings):
     mysql_user: Optional[str] = None
     mysql_password: Optional[str] = None
     
+    # SQLAlchemy connection pool (engine dùng để trích xuất schema)
+    db_pool_size: int = 10
+    db_max_overflow: int = 5
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 3600
+    db_pool_pre_ping: bool = True
+    db_pool_use_lifo: bool = True
+    db_use_null_pool: bool = False  # True: không giữ connection idle (chạy trích xuất một lần)
+    
+    # SQLAlchemy connection pool (engine dùng để chạy query của chatbot)
+    query_pool_size: int = 20
+    query_max_overflow: int = 10
+    query_pool_recycle: int = 1800
+    query_pool_pre_ping: bool = True
+    query_compiled_cache_size: int = 1200  # Số câu lệnh đã compile được SQLAlchemy cache lại
+    
+    # Gom các request phân loại intent đến cùng lúc thành một lần gọi LLM
+    intent_batching_enabled: bool = True
+    intent_batch_max_size: int = 8
+    intent_batch_max_wait_ms: int = 200
+    
     # Application
     app_name: str = "FastBase AI"
     app_version: str = "1.0.0"
@@ -33,10 +57,18 @@ class Settings(BaseSettings):
     # Logging
     log_level: str = "INFO"
     
-    class Config:
-        env_file = ".env"
-        case_sensitive = False
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        case_sensitive=False,
+        frozen=True,
+    )
+
+
+@lru_cache
+def get_settings() -> Settings:
+    """Parse env/.env một lần và dùng chung instance (dùng được với Depends)."""
+    return Settings()
 
 
-settings = Settings()
+settings = get_settings()
 
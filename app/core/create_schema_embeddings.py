@@ -9,19 +9,36 @@ Hoặc từ code:
     result = await create_and_save_embeddings(schema_doc_id="...")
 """
 import asyncio
+import hashlib
+import io
 import logging
-from typing import Optional, List, Dict, Any
+from functools import lru_cache
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
 from bson import ObjectId
+from pymongo import UpdateOne, WriteConcern
+from pymongo.errors import BulkWriteError
 
 from langchain_openai import OpenAIEmbeddings
 
+from app.core.cache import TTLCache
 from app.core.database import connect_to_mongo, get_database
+from app.core.embeddings import (
+    get_embedding_client,
+    encode_embedding_vector,
+    decode_embedding_vector,
+)
 from app.models.database_schema import DatabaseSchema, TableInfo, ColumnInfo, TableEmbedding
-from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Số request embedding chạy song song tối đa (tránh bị OpenAI rate limit 429)
+EMBEDDING_CONCURRENCY = 8
+
+# Cache schema documents (ít thay đổi, được đọc ở mỗi request text2sql).
+# Key: schema_doc_id, hoặc None cho schema mới nhất.
+_schema_cache = TTLCache(maxsize=64, ttl=60)
+
 
 def format_table_embedding_text(table: TableInfo, database_name: str) -> str:
     """
@@ -34,54 +51,106 @@ def format_table_embedding_text(table: TableInfo, database_name: str) -> str:
     Returns:
         Formatted text string
     """
+    return _format_table_embedding(table, database_name)[0]
+
+
+@lru_cache(maxsize=4096)
+def _format_column_line(
+    name: str,
+    data_type: str,
+    is_primary_key: bool,
+    foreign_key_table: Optional[str],
+    foreign_key_column: Optional[str],
+    is_nullable: bool,
+    default_value: Optional[str],
+    description: Optional[str],
+) -> str:
+    """
+    Format một dòng column (chỉ nhận kiểu primitive để cache được).
+    
+    Các column giống nhau (id, created_at, ...) lặp lại rất nhiều giữa các
+    tables và giữa các lần re-index, nên cache theo giá trị column.
+    """
+    line = f"\n- {name} ({data_type})"
+    
+    # Constraints và relationships
+    constraints = []
+    if is_primary_key:
+        constraints.append("Primary Key")
+    if foreign_key_table:
+        fk_ref = foreign_key_column if foreign_key_column else "?"
+        constraints.append(f"Foreign Key to {foreign_key_table}.{fk_ref}")
+    if not is_nullable:
+        constraints.append("NOT NULL")
+    if default_value:
+        constraints.append(f"Default: {default_value}")
+    
+    if constraints:
+        line += f" [{', '.join(constraints)}]"
+    
+    # Description
+    if description:
+        line += f" - {description}"
+    
+    return line
+
+
+def _format_table_embedding(
+    table: TableInfo, database_name: str
+) -> Tuple[str, List[str], List[Dict[str, Any]]]:
+    """
+    Format embedding text và gom primary keys / foreign keys trong cùng một lần duyệt columns.
+    
+    Returns:
+        Tuple (embedding_text, pk_columns, fk_list)
+    """
     # Tên table với schema
     full_table_name = f"{table.table_schema}.{table.table_name}" if table.table_schema != "public" else table.table_name
-    lines = [f"Table: {full_table_name}"]
+    buf = io.StringIO()
+    w = buf.write
+    w(f"Table: {full_table_name}")
     
     # Description nếu có
     if table.description:
-        lines.append(f"Description: {table.description}")
+        w(f"\nDescription: {table.description}")
     
-    lines.append("\nColumns:")
+    w("\n\nColumns:")
     
-    # Format columns
+    # Format columns, đồng thời gom PK/FK để không phải duyệt columns lại
+    pk_columns: List[str] = []
+    fk_list: List[Dict[str, Any]] = []
+    fk_info = []
     for col in table.columns:
-        col_parts = [f"- {col.name} ({col.data_type})"]
+        is_fk = bool(col.is_foreign_key and col.foreign_key_table)
+        w(_format_column_line(
+            col.name,
+            col.data_type,
+            col.is_primary_key,
+            col.foreign_key_table if is_fk else None,
+            col.foreign_key_column,
+            col.is_nullable,
+            col.default_value,
+            col.description,
+        ))
         
-        # Constraints và relationships
-        constraints = []
         if col.is_primary_key:
-            constraints.append("Primary Key")
-        if col.is_foreign_key and col.foreign_key_table:
+            pk_columns.append(col.name)
+        if is_fk:
             fk_ref = col.foreign_key_column if col.foreign_key_column else "?"
-            constraints.append(f"Foreign Key to {col.foreign_key_table}.{fk_ref}")
-        if not col.is_nullable:
-            constraints.append("NOT NULL")
-        if col.default_value:
-            constraints.append(f"Default: {col.default_value}")
-        
-        if constraints:
-            col_parts.append(f" [{', '.join(constraints)}]")
-        
-        # Description
-        if col.description:
-            col_parts.append(f" - {col.description}")
-        
-        lines.append("".join(col_parts))
+            fk_info.append(f"{col.name} -> {col.foreign_key_table}.{fk_ref}")
+            fk_list.append({
+                "column": col.name,
+                "foreign_table": col.foreign_key_table,
+                "foreign_column": col.foreign_key_column
+            })
     
     # Primary keys summary
-    pk_columns = [col.name for col in table.columns if col.is_primary_key]
     if pk_columns:
-        lines.append(f"\nPrimary Keys: {', '.join(pk_columns)}")
+        w(f"\n\nPrimary Keys: {', '.join(pk_columns)}")
     
     # Foreign keys summary
-    fk_info = []
-    for col in table.columns:
-        if col.is_foreign_key and col.foreign_key_table:
-            fk_ref = col.foreign_key_column if col.foreign_key_column else "?"
-            fk_info.append(f"{col.name} -> {col.foreign_key_table}.{fk_ref}")
     if fk_info:
-        lines.append(f"Foreign Keys: {'; '.join(fk_info)}")
+        w(f"\nForeign Keys: {'; '.join(fk_info)}")
     
     # Indexes
     if table.indexes:
@@ -92,13 +161,13 @@ def format_table_embedding_text(table: TableInfo, database_name: str) -> str:
             is_unique = "UNIQUE " if idx.get("is_unique") else ""
             index_info.append(f"{is_unique}{idx_name} on ({idx_columns})")
         if index_info:
-            lines.append(f"Indexes: {'; '.join(index_info)}")
+            w(f"\nIndexes: {'; '.join(index_info)}")
     
     # Row count
     if table.row_count is not None:
-        lines.append(f"Row Count: {table.row_count:,}")
+        w(f"\nRow Count: {table.row_count:,}")
     
-    return "\n".join(lines)
+    return buf.getvalue(), pk_columns, fk_list
 
 
 async def get_schema_from_mongodb(schema_doc_id: Optional[str] = None) -> Optional[DatabaseSchema]:
@@ -109,8 +178,17 @@ async def get_schema_from_mongodb(schema_doc_id: Optional[str] = None) -> Option
         schema_doc_id: ID của schema document. Nếu None, lấy schema mới nhất.
         
     Returns:
-        DatabaseSchema object hoặc None nếu không tìm thấy
+        DatabaseSchema object hoặc None nếu không tìm thấy. Mỗi lần gọi nhận một bản
+        copy riêng của schema đã cache, caller được phép sửa mà không ảnh hưởng cache.
     """
+    if schema_doc_id and not ObjectId.is_valid(schema_doc_id):
+        logger.warning(f"schema_doc_id không hợp lệ: {schema_doc_id}")
+        return None
+    
+    cached = _schema_cache.get(schema_doc_id)
+    if cached is not None:
+        return cached.model_copy(deep=True)
+    
     db = get_database()
     if db is None:
         raise RuntimeError("MongoDB chưa được kết nối. Gọi connect_to_mongo() trước.")
@@ -137,7 +215,111 @@ async def get_schema_from_mongodb(schema_doc_id: Optional[str] = None) -> Option
     elif "extracted_at" in doc:
         doc["extracted_at"] = datetime.fromisoformat(str(doc["extracted_at"]).replace('Z', '+00:00'))
     
-    return DatabaseSchema(**doc)
+    schema = DatabaseSchema(**doc)
+    _schema_cache.set(schema_doc_id, schema)
+    return schema.model_copy(deep=True)
+
+
+def invalidate_schema_cache() -> None:
+    """Xoá cache schema (gọi sau khi lưu schema mới vào MongoDB)."""
+    _schema_cache.clear()
+
+
+def _embedding_text_hash(embedding_text: str) -> str:
+    """Hash của embedding text, dùng để nhận biết table không thay đổi."""
+    return hashlib.blake2b(embedding_text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+async def load_cached_embedding_vectors(
+    text_hashes: List[str],
+    embedding_model_name: str,
+) -> Dict[str, List[float]]:
+    """
+    Lấy các embedding vectors đã có trong MongoDB theo text hash.
+    
+    Text giống nhau (cùng model) cho ra vector giống nhau, nên table không
+    thay đổi giữa các lần extract schema có thể dùng lại vector cũ.
+    
+    Args:
+        text_hashes: List hash của embedding text
+        embedding_model_name: Tên embedding model
+        
+    Returns:
+        Dict text_hash -> embedding_vector
+    """
+    db = get_database()
+    if db is None:
+        raise RuntimeError("MongoDB chưa được kết nối. Gọi connect_to_mongo() trước.")
+    
+    if not text_hashes:
+        return {}
+    
+    cursor = db.database_schema_embeddings.find(
+        {
+            "metadata.text_hash": {"$in": list(set(text_hashes))},
+            "embedding_model": embedding_model_name,
+        },
+        {"_id": 0, "metadata.text_hash": 1, "embedding_vector": 1},
+    )
+    
+    cached: Dict[str, List[float]] = {}
+    async for doc in cursor:
+        text_hash = doc.get("metadata", {}).get("text_hash")
+        if text_hash and text_hash not in cached:
+            cached[text_hash] = decode_embedding_vector(doc["embedding_vector"])
+    return cached
+
+
+def _build_table_embedding(
+    table: TableInfo,
+    embedding_text: str,
+    pk_columns: List[str],
+    fk_list: List[Dict[str, Any]],
+    embedding_vector: List[float],
+    schema_doc_id: str,
+    database_name: str,
+    database_type: str,
+    embedding_model_name: str,
+) -> TableEmbedding:
+    """
+    Tạo TableEmbedding từ text và vector đã có.
+    
+    Args:
+        table: TableInfo object
+        embedding_text: Text đã format để embedding
+        pk_columns: Tên các primary key columns
+        fk_list: Thông tin foreign keys
+        embedding_vector: Vector embedding tương ứng
+        schema_doc_id: ID của schema document
+        database_name: Tên database
+        database_type: Loại database
+        embedding_model_name: Tên embedding model đã dùng
+        
+    Returns:
+        TableEmbedding object
+    """
+    # Prepare metadata
+    metadata = {
+        "column_count": len(table.columns),
+        "row_count": table.row_count,
+        "has_foreign_keys": len(fk_list) > 0,
+        "primary_keys": pk_columns,
+        "foreign_keys": fk_list,
+        "index_count": len(table.indexes),
+        "text_hash": _embedding_text_hash(embedding_text),
+    }
+    
+    return TableEmbedding(
+        schema_doc_id=schema_doc_id,
+        database_name=database_name,
+        database_type=database_type,
+        table_name=table.table_name,
+        table_schema=table.table_schema,
+        embedding_text=embedding_text,
+        embedding_vector=embedding_vector,
+        embedding_model=embedding_model_name,
+        metadata=metadata,
+    )
 
 
 async def create_embeddings_for_table(
@@ -161,7 +343,7 @@ async def create_embeddings_for_table(
         TableEmbedding object
     """
     # Format text
-    embedding_text = format_table_embedding_text(table, database_name)
+    embedding_text, pk_columns, fk_list = _format_table_embedding(table, database_name)
     
     # Tạo embedding vector (OpenAIEmbeddings.embed_query là sync, cần wrap trong thread)
     try:
@@ -178,41 +360,17 @@ async def create_embeddings_for_table(
         logger.error(f"Lỗi khi tạo embedding: {e}")
         raise
     
-    # Prepare metadata
-    pk_columns = [col.name for col in table.columns if col.is_primary_key]
-    fk_list = [
-        {
-            "column": col.name,
-            "foreign_table": col.foreign_key_table,
-            "foreign_column": col.foreign_key_column
-        }
-        for col in table.columns
-        if col.is_foreign_key and col.foreign_key_table
-    ]
-    
-    metadata = {
-        "column_count": len(table.columns),
-        "row_count": table.row_count,
-        "has_foreign_keys": len(fk_list) > 0,
-        "primary_keys": pk_columns,
-        "foreign_keys": fk_list,
-        "index_count": len(table.indexes),
-    }
-    
-    # Tạo TableEmbedding
-    table_embedding = TableEmbedding(
+    return _build_table_embedding(
+        table=table,
+        embedding_text=embedding_text,
+        pk_columns=pk_columns,
+        fk_list=fk_list,
+        embedding_vector=embedding_vector,
         schema_doc_id=schema_doc_id,
         database_name=database_name,
         database_type=database_type,
-        table_name=table.table_name,
-        table_schema=table.table_schema,
-        embedding_text=embedding_text,
-        embedding_vector=embedding_vector,
-        embedding_model=embedding_model_instance.model,
-        metadata=metadata,
+        embedding_model_name=embedding_model_instance.model,
     )
-    
-    return table_embedding
 
 
 async def save_embeddings_to_mongodb(embeddings: List[TableEmbedding]) -> List[str]:
@@ -229,15 +387,67 @@ async def save_embeddings_to_mongodb(embeddings: List[TableEmbedding]) -> List[s
     if db is None:
         raise RuntimeError("MongoDB chưa được kết nối. Gọi connect_to_mongo() trước.")
     
-    collection = db.database_schema_embeddings
-    
-    # Convert to dict và exclude id
-    documents = [emb.model_dump(exclude={"id"}) for emb in embeddings]
-    
-    # Insert many
-    result = await collection.insert_many(documents)
+    # Embeddings có thể tạo lại được nên không cần chờ journal
+    collection = db.database_schema_embeddings.with_options(
+        write_concern=WriteConcern(w=1, j=False)
+    )
     
-    return [str(id) for id in result.inserted_ids]
+    # Convert to dict và exclude id; vector lưu dạng float32 bytes
+    # Upsert theo (schema_doc_id, table_schema, table_name) để chạy lại không tạo bản trùng
+    filters = []
+    operations = []
+    for emb in embeddings:
+        doc = emb.model_dump(exclude={"id", "embedding_vector", "created_at"})
+        doc["embedding_vector"] = encode_embedding_vector(emb.embedding_vector)
+        key = {
+            "schema_doc_id": emb.schema_doc_id,
+            "table_schema": emb.table_schema,
+            "table_name": emb.table_name,
+        }
+        filters.append(key)
+        operations.append(UpdateOne(
+            key,
+            {"$set": doc, "$setOnInsert": {"created_at": emb.created_at}},
+            upsert=True,
+        ))
+    
+    # Bulk write (unordered: không dừng cả batch khi một document lỗi)
+    failed_indexes = set()
+    try:
+        result = await collection.bulk_write(
+            operations, ordered=False, bypass_document_validation=True
+        )
+        upserted_ids = result.upserted_ids
+    except BulkWriteError as e:
+        upserted_ids = {u["index"]: u["_id"] for u in e.details.get("upserted", [])}
+        failed_indexes = {err["index"] for err in e.details.get("writeErrors", [])}
+        logger.warning(
+            f"Không thể lưu {len(failed_indexes)}/{len(operations)} embeddings: "
+            f"{e.details.get('writeErrors', [])[:3]}"
+        )
+    
+    doc_ids = {idx: str(_id) for idx, _id in upserted_ids.items()}
+    
+    # Các document đã tồn tại (được update) không có trong upserted_ids, lấy lại _id theo key
+    matched = [
+        idx for idx in range(len(operations))
+        if idx not in doc_ids and idx not in failed_indexes
+    ]
+    if matched:
+        cursor = collection.find(
+            {"$or": [filters[idx] for idx in matched]},
+            {"_id": 1, "schema_doc_id": 1, "table_schema": 1, "table_name": 1},
+        )
+        existing = {}
+        async for doc in cursor:
+            existing[(doc["schema_doc_id"], doc["table_schema"], doc["table_name"])] = str(doc["_id"])
+        for idx in matched:
+            key = filters[idx]
+            doc_id = existing.get((key["schema_doc_id"], key["table_schema"], key["table_name"]))
+            if doc_id:
+                doc_ids[idx] = doc_id
+    
+    return [doc_ids[idx] for idx in sorted(doc_ids)]
 
 
 async def create_and_save_embeddings(
@@ -281,31 +491,76 @@ async def create_and_save_embeddings(
     logger.info(f"Database: {schema.database_name} ({schema.database_type})")
     logger.info(f"Số bảng: {len(schema.tables)}")
     
-    # Khởi tạo embedding model
-    embedding_model = OpenAIEmbeddings(
-        model=embedding_model_name,
-        openai_api_key=settings.openai_api_key
-    )
+    # Embedding model dùng chung
+    embedding_model = get_embedding_client(embedding_model_name)
     
-    # Tạo embeddings cho từng table
     embeddings = []
     errors = []
     
-    for idx, table in enumerate(schema.tables, 1):
+    formatted = [_format_table_embedding(table, schema.database_name) for table in schema.tables]
+    texts = [text for text, _, _ in formatted]
+    
+    # Dùng lại vector của các table không thay đổi (cùng embedding text)
+    text_hashes = [_embedding_text_hash(text) for text in texts]
+    try:
+        cached_vectors = await load_cached_embedding_vectors(text_hashes, embedding_model_name)
+    except Exception as e:
+        logger.warning(f"Không thể load embeddings đã có, sẽ embed lại toàn bộ: {e}")
+        cached_vectors = {}
+    vectors: List[Optional[List[float]]] = [cached_vectors.get(h) for h in text_hashes]
+    pending = [idx for idx, vector in enumerate(vectors) if vector is None]
+    logger.info(f"Dùng lại {len(texts) - len(pending)} embeddings đã có, cần embed {len(pending)} tables")
+    
+    # Tạo embeddings cho các table còn lại bằng một lần gọi batch
+    if pending:
         try:
-            logger.info(f"Đang xử lý table {idx}/{len(schema.tables)}: {table.table_name}")
-            embedding = await create_embeddings_for_table(
+            new_vectors = await embedding_model.aembed_documents([texts[idx] for idx in pending])
+            for idx, vector in zip(pending, new_vectors):
+                vectors[idx] = vector
+        except Exception as e:
+            logger.warning(f"Batch embedding thất bại, chuyển sang embedding từng table: {e}")
+    
+    for table, (text, pk_columns, fk_list), vector in zip(schema.tables, formatted, vectors):
+        if vector is not None:
+            embeddings.append(_build_table_embedding(
                 table=table,
+                embedding_text=text,
+                pk_columns=pk_columns,
+                fk_list=fk_list,
+                embedding_vector=vector,
                 schema_doc_id=schema_doc_id,
                 database_name=schema.database_name,
                 database_type=schema.database_type,
-                embedding_model_instance=embedding_model
-            )
-            embeddings.append(embedding)
-        except Exception as e:
-            error_msg = f"Lỗi khi tạo embedding cho table {table.table_name}: {str(e)}"
-            logger.error(error_msg, exc_info=True)
-            errors.append(error_msg)
+                embedding_model_name=embedding_model.model,
+            ))
+    
+    failed_tables = [table for table, vector in zip(schema.tables, vectors) if vector is None]
+    if failed_tables:
+        # Fallback: embed từng table song song (giới hạn bởi semaphore)
+        # để giữ lại các table embed thành công
+        semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+        
+        async def _embed_table(table: TableInfo) -> TableEmbedding:
+            async with semaphore:
+                return await create_embeddings_for_table(
+                    table=table,
+                    schema_doc_id=schema_doc_id,
+                    database_name=schema.database_name,
+                    database_type=schema.database_type,
+                    embedding_model_instance=embedding_model
+                )
+        
+        results = await asyncio.gather(
+            *[_embed_table(table) for table in failed_tables],
+            return_exceptions=True,
+        )
+        for table, result in zip(failed_tables, results):
+            if isinstance(result, Exception):
+                error_msg = f"Lỗi khi tạo embedding cho table {table.table_name}: {str(result)}"
+                logger.error(error_msg, exc_info=result)
+                errors.append(error_msg)
+            else:
+                embeddings.append(result)
     
     # Lưu vào MongoDB
     if embeddings:
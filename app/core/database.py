@@ -1,11 +1,33 @@
+import asyncio
+import importlib.util
+
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo.errors import ConnectionFailure
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import ConnectionFailure, PyMongoError
 from app.core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _available_compressors() -> str:
+    """
+    Danh sách wire compressors cho MongoDB theo thứ tự ưu tiên, chỉ gồm các
+    compressor có thư viện đã cài (zlib có sẵn trong stdlib).
+    """
+    compressors = [
+        name
+        for name, module in (("zstd", "zstandard"), ("snappy", "snappy"))
+        if importlib.util.find_spec(module) is not None
+    ]
+    compressors.append("zlib")
+    return ",".join(compressors)
+
+
+# Nén dữ liệu trên đường truyền (server chọn compressor đầu tiên mà nó cũng hỗ trợ)
+MONGODB_COMPRESSORS = _available_compressors()
+
+
 class MongoDB:
     client: AsyncIOMotorClient = None
     database = None
@@ -17,15 +39,58 @@ mongodb = MongoDB()
 async def connect_to_mongo():
     """Create database connection"""
     try:
-        mongodb.client = AsyncIOMotorClient(settings.mongodb_url)
+        mongodb.client = AsyncIOMotorClient(
+            settings.mongodb_url,
+            maxPoolSize=settings.mongodb_max_pool_size,
+            minPoolSize=settings.mongodb_min_pool_size,
+            maxIdleTimeMS=60000,
+            serverSelectionTimeoutMS=3000,
+            compressors=MONGODB_COMPRESSORS,
+        )
         mongodb.database = mongodb.client[settings.mongodb_db_name]
         # Test connection
         await mongodb.client.admin.command('ping')
+        # Pre-warm pool: mở sẵn minPoolSize connections để request đầu tiên
+        # của mỗi burst không phải chờ handshake
+        await asyncio.gather(*[
+            mongodb.client.admin.command('ping')
+            for _ in range(settings.mongodb_min_pool_size)
+        ])
         logger.info("Connected to MongoDB successfully")
     except ConnectionFailure as e:
         logger.error(f"Failed to connect to MongoDB: {e}")
         raise
 
+    await ensure_indexes()
+
+
+async def ensure_indexes():
+    """Create indexes used by schema/embedding lookups (idempotent)"""
+    db = mongodb.database
+    indexes = [
+        # get_schema_from_mongodb: find_one(sort=[("extracted_at", -1)])
+        (db.database_schemas, [("extracted_at", DESCENDING)], {}),
+        # extract_and_save_schema: document mới nhất của một database (so sánh fingerprint)
+        (db.database_schemas, [("database_name", ASCENDING), ("extracted_at", DESCENDING)], {}),
+        # load_embeddings_from_mongodb: find({"schema_doc_id": ...})
+        # save_embeddings_to_mongodb: upsert theo (schema_doc_id, table_schema, table_name)
+        (
+            db.database_schema_embeddings,
+            [("schema_doc_id", ASCENDING), ("table_schema", ASCENDING), ("table_name", ASCENDING)],
+            {"unique": True},
+        ),
+        # load_cached_embedding_vectors: find({"metadata.text_hash": {"$in": ...}})
+        (db.database_schema_embeddings, [("metadata.text_hash", ASCENDING)], {}),
+    ]
+    for collection, keys, options in indexes:
+        try:
+            await collection.create_index(keys, background=True, **options)
+        except PyMongoError as e:
+            # Không chặn startup nếu không tạo được index
+            # (ví dụ: unique index khi collection còn documents trùng lặp)
+            logger.warning(f"Failed to create index {keys} on {collection.name}: {e}")
+    logger.info("MongoDB indexes ensured")
+
 
 async def close_mongo_connection():
     """Close database connection"""
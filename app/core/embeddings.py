@@ -0,0 +1,64 @@
+"""
+Dùng chung OpenAIEmbeddings client trong toàn bộ app.
+
+Mỗi OpenAIEmbeddings tự tạo httpx client và connection pool riêng,
+nên giữ một instance cho mỗi model để tái sử dụng kết nối giữa các lần gọi.
+"""
+from typing import Dict, List, Sequence, Union
+
+import numpy as np
+from bson import Binary
+from langchain_openai import OpenAIEmbeddings
+
+from app.core.config import settings
+from app.core.http_client import get_openai_http_client
+
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-large"
+
+_embedding_clients: Dict[str, OpenAIEmbeddings] = {}
+
+
+def get_embedding_client(model_name: str = DEFAULT_EMBEDDING_MODEL) -> OpenAIEmbeddings:
+    """
+    Lấy OpenAIEmbeddings instance dùng chung cho model.
+    
+    Args:
+        model_name: Tên embedding model
+        
+    Returns:
+        OpenAIEmbeddings instance (tạo mới ở lần gọi đầu tiên)
+    """
+    client = _embedding_clients.get(model_name)
+    if client is None:
+        client = OpenAIEmbeddings(
+            model=model_name,
+            openai_api_key=settings.openai_api_key,
+            http_async_client=get_openai_http_client(),
+        )
+        _embedding_clients[model_name] = client
+    return client
+
+
+def clear_embedding_clients() -> None:
+    """Bỏ các embedding client đã cache (gọi khi shutdown, sau khi đóng http client dùng chung)."""
+    _embedding_clients.clear()
+
+
+def encode_embedding_vector(vector: Sequence[float]) -> Binary:
+    """
+    Đóng gói embedding vector thành float32 bytes để lưu vào MongoDB.
+    
+    Nhỏ hơn một nửa so với BSON array of doubles và encode/decode nhanh hơn nhiều.
+    """
+    return Binary(np.asarray(vector, dtype=np.float32).tobytes())
+
+
+def decode_embedding_vector(value: Union[bytes, List[float]]) -> List[float]:
+    """
+    Giải mã embedding vector đọc từ MongoDB.
+    
+    Hỗ trợ cả documents cũ (BSON array) và documents mới (float32 bytes).
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return np.frombuffer(value, dtype=np.float32).tolist()
+    return value
@@ -10,456 +10,792 @@ Hoặc từ code:
 """
 import asyncio
 import logging
-from typing import Optional
-from sqlalchemy import create_engine, text
+import sys
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+from sqlalchemy import TextClause, create_engine, func, select, table, text
+from sqlalchemy.engine import Engine, Row
+from sqlalchemy.pool import NullPool
 
+from app.core.cache import TTLCache
 from app.core.database import connect_to_mongo, get_database
+from app.core.create_schema_embeddings import invalidate_schema_cache
 from app.core.sql_database import SQLDatabaseConnector, create_sql_connector
-from app.models.database_schema import DatabaseSchema, TableInfo, ColumnInfo
+from app.models.database_schema import DatabaseSchema
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Số query COUNT(*) chạy song song (mỗi query dùng một connection riêng của pool)
+ROW_COUNT_CONCURRENCY = 8
+
+# Đọc result của các query metadata lớn (columns, keys/indexes) theo từng phần bằng server-side cursor
+_STREAM_OPTIONS = {"stream_results": True, "yield_per": 1000}
+
+# ID document schema đã trích xuất/lưu gần nhất theo (db_uri, database),
+# giúp bỏ qua cả query fingerprint trong khoảng ttl
+_extracted_schema_cache = TTLCache(maxsize=32, ttl=300)
+
+# data_type/table_schema chỉ có vài chục giá trị khác nhau trên toàn schema:
+# intern để các column dùng chung một object str thay vì mỗi dòng một bản sao
+_intern = sys.intern
+
+# Engine (kèm connection pool) dùng chung theo db_uri giữa các lần trích xuất
+_ENGINE_CACHE: Dict[str, Engine] = {}
+# _get_engine được gọi từ nhiều worker thread (asyncio.to_thread): khoá để mỗi db_uri chỉ tạo một engine
+_ENGINE_CACHE_LOCK = threading.Lock()
+
+
+def _get_engine(db_uri: str) -> Engine:
+    """Lấy engine đã tạo cho db_uri, tạo mới nếu chưa có."""
+    engine = _ENGINE_CACHE.get(db_uri)
+    if engine is not None:
+        return engine
+    with _ENGINE_CACHE_LOCK:
+        engine = _ENGINE_CACHE.get(db_uri)
+        if engine is None:
+            if settings.db_use_null_pool:
+                engine = create_engine(db_uri, poolclass=NullPool)
+            else:
+                engine = create_engine(
+                    db_uri,
+                    pool_size=settings.db_pool_size,
+                    max_overflow=settings.db_max_overflow,
+                    pool_timeout=settings.db_pool_timeout,
+                    pool_recycle=settings.db_pool_recycle,
+                    pool_pre_ping=settings.db_pool_pre_ping,
+                    pool_use_lifo=settings.db_pool_use_lifo
+                )
+            _ENGINE_CACHE[db_uri] = engine
+    return engine
+
+
+# Các câu lệnh SQL dùng chung, khởi tạo một lần ở module scope
+_PG_FINGERPRINT_SQL = text("""
+    SELECT
+        md5(COALESCE(string_agg(
+            n.nspname || '.' || c.relname || '.' || a.attname || ':'
+                || format_type(a.atttypid, a.atttypmod) || ':' || a.attnotnull::text || ':'
+                || COALESCE(pg_get_expr(ad.adbin, ad.adrelid), '') || ':'
+                || COALESCE(col_description(c.oid, a.attnum), ''),
+            ',' ORDER BY n.nspname, c.relname, a.attnum
+        ), '')),
+        max(c.oid::bigint),
+        (
+            SELECT md5(COALESCE(string_agg(
+                vn.nspname || '.' || v.relname || ':' || pg_get_viewdef(v.oid),
+                ',' ORDER BY vn.nspname, v.relname
+            ), ''))
+            FROM pg_class v
+            JOIN pg_namespace vn ON vn.oid = v.relnamespace
+            WHERE v.relkind = 'v'
+            AND vn.nspname NOT IN ('information_schema', 'pg_catalog', 'pg_toast')
+        ),
+        (
+            SELECT md5(COALESCE(string_agg(
+                pg_get_indexdef(ix.indexrelid),
+                ',' ORDER BY pg_get_indexdef(ix.indexrelid)
+            ), ''))
+            FROM pg_index ix
+            JOIN pg_class t ON t.oid = ix.indrelid
+            JOIN pg_namespace tn ON tn.oid = t.relnamespace
+            WHERE tn.nspname NOT IN ('information_schema', 'pg_catalog', 'pg_toast')
+        ),
+        (
+            SELECT md5(COALESCE(string_agg(
+                con.conrelid::regclass::text || '.' || con.conname || ':' || pg_get_constraintdef(con.oid),
+                ',' ORDER BY con.conrelid::regclass::text, con.conname
+            ), ''))
+            FROM pg_constraint con
+            JOIN pg_namespace cn ON cn.oid = con.connamespace
+            WHERE cn.nspname NOT IN ('information_schema', 'pg_catalog', 'pg_toast')
+        )
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    LEFT JOIN pg_attrdef ad ON ad.adrelid = c.oid AND ad.adnum = a.attnum
+    WHERE c.relkind IN ('r', 'p', 'v')
+    AND n.nspname NOT IN ('information_schema', 'pg_catalog', 'pg_toast')
+""")
+
+# column_default NULL và chuỗi rỗng được phân biệt bằng tiền tố (CONCAT_WS bỏ qua NULL)
+_MY_FINGERPRINT_SQL = text("""
+    SELECT
+        COUNT(*),
+        SUM(CRC32(CONCAT_WS(
+            ':', table_name, column_name, column_type, is_nullable, column_key,
+            IF(column_default IS NULL, 'N', CONCAT('D', column_default)), column_comment
+        ))),
+        (
+            SELECT COALESCE(SUM(CRC32(CONCAT_WS(':', table_name, view_definition))), 0)
+            FROM information_schema.views
+            WHERE table_schema = :db_name
+        ),
+        (
+            SELECT COALESCE(SUM(CRC32(CONCAT_WS(
+                ':', table_name, index_name, seq_in_index, column_name, non_unique
+            ))), 0)
+            FROM information_schema.statistics
+            WHERE table_schema = :db_name
+        ),
+        (
+            SELECT COALESCE(SUM(CRC32(CONCAT_WS(
+                ':', table_name, constraint_name, column_name,
+                referenced_table_schema, referenced_table_name, referenced_column_name
+            ))), 0)
+            FROM information_schema.key_column_usage
+            WHERE table_schema = :db_name
+            AND referenced_table_name IS NOT NULL
+        )
+    FROM information_schema.columns
+    WHERE table_schema = :db_name
+""")
+
+# Tables và views trong cùng một query, phân biệt bằng table_type
+_PG_TABLES_SQL = text("""
+    SELECT
+        t.table_schema,
+        t.table_name,
+        t.table_type,
+        pgc.reltuples::bigint AS row_estimate,
+        NULL::text AS view_definition
+    FROM information_schema.tables t
+    JOIN pg_namespace pgn ON pgn.nspname = t.table_schema
+    JOIN pg_class pgc ON pgc.relnamespace = pgn.oid AND pgc.relname = t.table_name
+    WHERE t.table_schema NOT IN ('information_schema', 'pg_catalog', 'pg_toast')
+    AND t.table_type = 'BASE TABLE'
+    AND (CAST(:include_tables AS text[]) IS NULL OR t.table_name = ANY(CAST(:include_tables AS text[])))
+    UNION ALL
+    SELECT v.table_schema, v.table_name, 'VIEW', NULL::bigint, v.view_definition
+    FROM information_schema.views v
+    WHERE v.table_schema NOT IN ('information_schema', 'pg_catalog')
+    AND (CAST(:include_tables AS text[]) IS NULL OR v.table_name = ANY(CAST(:include_tables AS text[])))
+    ORDER BY table_schema, table_name
+""")
+
+_PG_COLUMNS_SQL = text("""
+    SELECT 
+        c.table_schema,
+        c.table_name,
+        c.column_name,
+        c.data_type,
+        c.is_nullable,
+        c.column_default,
+        c.character_maximum_length,
+        c.numeric_precision,
+        c.numeric_scale,
+        col_description(pgc.oid, c.ordinal_position) as description
+    FROM information_schema.columns c
+    JOIN pg_class pgc ON pgc.relname = c.table_name
+    JOIN pg_namespace pgn ON pgn.oid = pgc.relnamespace AND pgn.nspname = c.table_schema
+    WHERE c.table_schema NOT IN ('information_schema', 'pg_catalog', 'pg_toast')
+    AND (CAST(:include_tables AS text[]) IS NULL OR c.table_name = ANY(CAST(:include_tables AS text[])))
+    ORDER BY c.table_schema, c.table_name, c.ordinal_position
+""")
+
+# PK, FK (pg_constraint) và indexes (pg_index) trong cùng một query;
+# unnest WITH ORDINALITY giữ đúng thứ tự column của constraint/index
+_PG_KEYS_SQL = text("""
+    SELECT
+        con.contype::text AS kind,
+        n.nspname AS table_schema,
+        c.relname AS table_name,
+        con.conname AS name,
+        a.attname AS column_name,
+        NULL::boolean AS is_unique,
+        nf.nspname AS foreign_table_schema,
+        cf.relname AS foreign_table_name,
+        af.attname AS foreign_column_name,
+        k.ord
+    FROM pg_constraint con
+    JOIN pg_class c ON c.oid = con.conrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    CROSS JOIN LATERAL unnest(con.conkey, con.confkey) WITH ORDINALITY AS k(attnum, fattnum, ord)
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum
+    LEFT JOIN pg_class cf ON cf.oid = con.confrelid
+    LEFT JOIN pg_namespace nf ON nf.oid = cf.relnamespace
+    LEFT JOIN pg_attribute af ON af.attrelid = con.confrelid AND af.attnum = k.fattnum
+    WHERE con.contype IN ('p', 'f')
+    AND n.nspname NOT IN ('information_schema', 'pg_catalog', 'pg_toast')
+    AND (CAST(:include_tables AS text[]) IS NULL OR c.relname = ANY(CAST(:include_tables AS text[])))
+    UNION ALL
+    SELECT
+        'i' AS kind,
+        n.nspname AS table_schema,
+        t.relname AS table_name,
+        i.relname AS name,
+        a.attname AS column_name,
+        ix.indisunique AS is_unique,
+        NULL,
+        NULL,
+        NULL,
+        k.ord
+    FROM pg_index ix
+    JOIN pg_class i ON i.oid = ix.indexrelid
+    JOIN pg_class t ON t.oid = ix.indrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    CROSS JOIN LATERAL unnest(ix.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+    JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+    WHERE NOT ix.indisprimary
+    AND n.nspname NOT IN ('information_schema', 'pg_catalog', 'pg_toast')
+    AND (CAST(:include_tables AS text[]) IS NULL OR t.relname = ANY(CAST(:include_tables AS text[])))
+    ORDER BY kind, table_schema, table_name, name, ord
+""")
+
+# Tables và views trong cùng một query, phân biệt bằng table_type
+_MY_TABLES_SQL = text("""
+    SELECT table_schema, table_name, table_type, table_rows, NULL AS view_definition
+    FROM information_schema.tables
+    WHERE table_schema = :db_name
+    AND table_type = 'BASE TABLE'
+    AND (:include_tables IS NULL OR FIND_IN_SET(table_name, :include_tables) > 0)
+    UNION ALL
+    SELECT table_schema, table_name, 'VIEW', NULL, view_definition
+    FROM information_schema.views
+    WHERE table_schema = :db_name
+    AND (:include_tables IS NULL OR FIND_IN_SET(table_name, :include_tables) > 0)
+    ORDER BY table_name
+""")
+
+_MY_PK_SQL = text("""
+    SELECT table_name, column_name
+    FROM information_schema.key_column_usage
+    WHERE table_schema = :db_name
+    AND constraint_name = 'PRIMARY'
+    AND (:include_tables IS NULL OR FIND_IN_SET(table_name, :include_tables) > 0)
+""")
+
+_MY_FK_SQL = text("""
+    SELECT
+        table_name,
+        column_name,
+        referenced_table_schema,
+        referenced_table_name,
+        referenced_column_name
+    FROM information_schema.key_column_usage
+    WHERE table_schema = :db_name
+    AND referenced_table_name IS NOT NULL
+    AND (:include_tables IS NULL OR FIND_IN_SET(table_name, :include_tables) > 0)
+""")
+
+_MY_COLUMNS_SQL = text("""
+    SELECT 
+        table_name,
+        column_name,
+        data_type,
+        is_nullable,
+        column_default,
+        character_maximum_length,
+        numeric_precision,
+        numeric_scale,
+        column_comment as description
+    FROM information_schema.columns
+    WHERE table_schema = :db_name
+    AND (:include_tables IS NULL OR FIND_IN_SET(table_name, :include_tables) > 0)
+    ORDER BY table_name, ordinal_position
+""")
+
+_MY_INDEXES_SQL = text("""
+    SELECT
+        table_name,
+        index_name,
+        column_name,
+        non_unique
+    FROM information_schema.statistics
+    WHERE table_schema = :db_name
+    AND index_name != 'PRIMARY'
+    AND (:include_tables IS NULL OR FIND_IN_SET(table_name, :include_tables) > 0)
+    ORDER BY table_name, index_name, seq_in_index
+""")
+
+
+def _build_column_dict(row: Sequence[Any]) -> Dict[str, Any]:
+    """
+    Tạo dict column (cùng keys với ColumnInfo) trực tiếp từ một dòng kết quả.
+    
+    Thông tin PK/FK được điền sau bằng _apply_key_info (keys đọc song song với columns).
+    
+    Args:
+        row: (column_name, data_type, is_nullable, column_default,
+            character_maximum_length, numeric_precision, numeric_scale, description)
+    """
+    return {
+        "name": row[0],
+        "data_type": _intern(row[1]),
+        "is_nullable": row[2] == 'YES',
+        "default_value": row[3],
+        "character_maximum_length": row[4],
+        "numeric_precision": row[5],
+        "numeric_scale": row[6],
+        "is_primary_key": False,
+        "is_foreign_key": False,
+        "foreign_key_table": None,
+        "foreign_key_column": None,
+        "description": row[7]
+    }
+
+
+def _apply_key_info(
+    columns_by_table: Dict[Any, List[Dict[str, Any]]],
+    pk_by_table: Dict[Any, set],
+    fk_by_table: Dict[Any, Dict[str, Dict[str, str]]]
+) -> None:
+    """Đánh dấu PK/FK cho các column đã build (chỉ duyệt các bảng có key)."""
+    for key, primary_keys in pk_by_table.items():
+        for column in columns_by_table.get(key, ()):
+            if column["name"] in primary_keys:
+                column["is_primary_key"] = True
+    for key, foreign_keys in fk_by_table.items():
+        for column in columns_by_table.get(key, ()):
+            fk_info = foreign_keys.get(column["name"])
+            if fk_info is not None:
+                column["is_foreign_key"] = True
+                column["foreign_key_table"] = fk_info["table"]
+                column["foreign_key_column"] = fk_info["column"]
+
+
+def _fetch_rows(
+    engine: Engine,
+    statement: TextClause,
+    params: Dict[str, Any]
+) -> List[Row]:
+    """
+    Chạy một query trên connection riêng lấy từ pool.
+    
+    Kết quả được buffer toàn bộ trong bộ nhớ (metadata catalog, không phải dữ liệu bảng)
+    để trả về cho thread gọi.
+    """
+    with engine.connect() as connection:
+        return connection.execute(statement, params).fetchall()
+
+
+def _stream_rows(
+    engine: Engine,
+    statement: TextClause,
+    params: Dict[str, Any],
+    consume: Callable[[Sequence[Row]], None]
+) -> None:
+    """
+    Chạy một query trên connection riêng, đọc bằng server-side cursor.
+    
+    Mỗi partition (yield_per dòng) được đưa cho consume ngay khi cursor còn mở rồi bỏ đi,
+    nên bộ nhớ chỉ giữ một partition rows thay vì toàn bộ kết quả.
+    """
+    with engine.connect() as connection:
+        result = connection.execute(statement, params, execution_options=_STREAM_OPTIONS)
+        for partition in result.partitions():
+            consume(partition)
+
+
+def _fetch_concurrently(
+    engine: Engine,
+    statements: Dict[str, Tuple[TextClause, Dict[str, Any]]],
+    streams: Optional[Dict[str, Tuple[TextClause, Dict[str, Any], Callable[[Sequence[Row]], None]]]] = None
+) -> Dict[str, List[Row]]:
+    """
+    Gửi song song các query độc lập, mỗi query trên một connection riêng.
+    
+    Tổng thời gian xấp xỉ query chậm nhất thay vì tổng round-trip của tất cả query.
+    
+    Args:
+        engine: SQLAlchemy engine
+        statements: Map tên -> (câu lệnh, params); kết quả được buffer và trả về
+        streams: Map tên -> (câu lệnh, params, consume) cho các query lớn; rows được
+            xử lý từng partition bởi consume (chạy trong worker thread) và không trả về
+        
+    Returns:
+        Map tên -> danh sách rows (chỉ các query trong statements)
+    """
+    streams = streams or {}
+    with ThreadPoolExecutor(max_workers=len(statements) + len(streams)) as executor:
+        futures = {
+            name: executor.submit(_fetch_rows, engine, statement, params)
+            for name, (statement, params) in statements.items()
+        }
+        stream_futures = [
+            executor.submit(_stream_rows, engine, statement, params, consume)
+            for statement, params, consume in streams.values()
+        ]
+    # Đưa exception của query stream (nếu có) lên thread gọi
+    for future in stream_futures:
+        future.result()
+    return {name: future.result() for name, future in futures.items()}
+
+
+def _count_rows(engine: Engine, schema_name: Optional[str], table_name: str) -> Optional[int]:
+    """Chạy một query COUNT(*) trên connection riêng lấy từ pool."""
+    # Tên schema/bảng được dialect quote đúng cách, không ghép chuỗi SQL thủ công
+    count_stmt = select(func.count()).select_from(table(table_name, schema=schema_name))
+    with engine.connect() as connection:
+        return connection.execute(count_stmt).scalar()
+
+
+def _fetch_row_counts(
+    engine: Engine,
+    table_refs: List[Tuple[Optional[str], str]]
+) -> Dict[Tuple[Optional[str], str], Optional[int]]:
+    """
+    Chạy song song các query COUNT(*) trong thread pool.
+    
+    Args:
+        engine: SQLAlchemy engine (pool cung cấp connection cho từng query)
+        table_refs: Danh sách (schema, tên bảng); schema None để dùng schema mặc định
+        
+    Returns:
+        Map (schema, tên bảng) -> row count (None nếu query lỗi)
+    """
+    def count(table_ref: Tuple[Optional[str], str]) -> Optional[int]:
+        try:
+            return _count_rows(engine, *table_ref)
+        except Exception as e:
+            logger.warning(f"Không thể lấy row count cho {table_ref[1]}: {e}")
+            return None
+    
+    with ThreadPoolExecutor(max_workers=ROW_COUNT_CONCURRENCY) as executor:
+        results = list(executor.map(count, table_refs))
+    return dict(zip(table_refs, results))
+
+
+def _compute_schema_fingerprint(engine: Engine, connector: SQLDatabaseConnector) -> Optional[str]:
+    """
+    Tính fingerprint cấu trúc schema bằng một query duy nhất trên catalog.
+    
+    Fingerprint thay đổi khi thêm/xoá/đổi tên bảng, cột, kiểu dữ liệu, nullable,
+    default, comment của cột, định nghĩa view hoặc định nghĩa index/constraint
+    (kể cả index chuyển sang cột khác); không phụ thuộc vào dữ liệu (row count).
+    
+    Returns:
+        Chuỗi fingerprint, hoặc None nếu database type không được hỗ trợ
+    """
+    if connector.db_type == "postgres":
+        fingerprint_query = _PG_FINGERPRINT_SQL
+        params = {}
+    elif connector.db_type == "mysql":
+        fingerprint_query = _MY_FINGERPRINT_SQL
+        params = {"db_name": connector.database}
+    else:
+        return None
+    
+    with engine.connect() as connection:
+        row = connection.execute(fingerprint_query, params).one()
+    return "|".join(str(value) for value in row)
+
 
 async def extract_postgres_schema(
-    connector: SQLDatabaseConnector
-) -> DatabaseSchema:
+    connector: SQLDatabaseConnector,
+    exact_counts: bool = False,
+    include_tables: Optional[List[str]] = None
+) -> Dict[str, Any]:
     """
     Trích xuất schema từ PostgreSQL database.
     
     Args:
         connector: SQLDatabaseConnector instance
+        exact_counts: True để đếm chính xác bằng COUNT(*) (full scan từng bảng).
+            Mặc định dùng ước lượng pg_class.reltuples.
+        include_tables: Chỉ trích xuất các bảng có tên trong danh sách (lọc ngay trong SQL).
+            None để lấy toàn bộ.
         
     Returns:
-        DatabaseSchema object chứa toàn bộ schema information
+        Schema document (dict cùng cấu trúc với DatabaseSchema) chứa toàn bộ schema information
     """
+    # Các query SQLAlchemy là blocking, chạy trong worker thread để không chặn event loop
+    return await asyncio.to_thread(_extract_postgres_schema_sync, connector, exact_counts, include_tables)
+
+
+def _extract_postgres_schema_sync(
+    connector: SQLDatabaseConnector,
+    exact_counts: bool,
+    include_tables: Optional[List[str]]
+) -> Dict[str, Any]:
+    """Phần đồng bộ của extract_postgres_schema (chạy trong worker thread)."""
     # Tạo SQLAlchemy engine để query information_schema
-    engine = create_engine(connector.db_uri)
+    engine = _get_engine(connector.db_uri)
     
-    with engine.connect() as connection:
-        # Lấy danh sách tables (bao gồm schema)
-        tables_query = text("""
-            SELECT table_schema, table_name, table_type
-            FROM information_schema.tables
-            WHERE table_schema NOT IN ('information_schema', 'pg_catalog', 'pg_toast')
-            AND table_type = 'BASE TABLE'
-            ORDER BY table_schema, table_name
-        """)
-        tables_result = connection.execute(tables_query)
-        tables = [{"table_schema": row[0], "table_name": row[1], "table_type": row[2]} for row in tables_result]
-        
-        table_infos = []
-        
-        for table_row in tables:
-            schema_name = table_row['table_schema']
-            table_name = table_row['table_name']
-            full_table_name = f"{schema_name}.{table_name}" if schema_name != 'public' else table_name
-            
-            # Lấy columns với chi tiết
-            columns_query = text("""
-                SELECT 
-                    c.column_name,
-                    c.data_type,
-                    c.is_nullable,
-                    c.column_default,
-                    c.character_maximum_length,
-                    c.numeric_precision,
-                    c.numeric_scale,
-                    col_description(pgc.oid, c.ordinal_position) as description
-                FROM information_schema.columns c
-                JOIN pg_class pgc ON pgc.relname = c.table_name
-                JOIN pg_namespace pgn ON pgn.oid = pgc.relnamespace AND pgn.nspname = c.table_schema
-                WHERE c.table_schema = :schema_name AND c.table_name = :table_name
-                ORDER BY c.ordinal_position
-            """)
-            columns_result = connection.execute(
-                columns_query,
-                {"schema_name": schema_name, "table_name": table_name}
-            )
-            columns_data = [
-                {
-                    "column_name": row[0],
-                    "data_type": row[1],
-                    "is_nullable": row[2],
-                    "column_default": row[3],
-                    "character_maximum_length": row[4],
-                    "numeric_precision": row[5],
-                    "numeric_scale": row[6],
-                    "description": row[7]
-                }
-                for row in columns_result
-            ]
-            
-            # Lấy primary keys
-            pk_query = text("""
-                SELECT a.attname
-                FROM pg_index i
-                JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
-                JOIN pg_class pgc ON pgc.oid = i.indrelid
-                JOIN pg_namespace pgn ON pgn.oid = pgc.relnamespace
-                WHERE i.indisprimary = true
-                AND pgn.nspname = :schema_name
-                AND pgc.relname = :table_name
-            """)
-            pk_result = connection.execute(
-                pk_query,
-                {"schema_name": schema_name, "table_name": table_name}
-            )
-            primary_keys = {row[0] for row in pk_result}
-            
-            # Lấy foreign keys
-            fk_query = text("""
-                SELECT
-                    kcu.column_name,
-                    ccu.table_schema AS foreign_table_schema,
-                    ccu.table_name AS foreign_table_name,
-                    ccu.column_name AS foreign_column_name
-                FROM information_schema.table_constraints AS tc
-                JOIN information_schema.key_column_usage AS kcu
-                    ON tc.constraint_name = kcu.constraint_name
-                    AND tc.table_schema = kcu.table_schema
-                JOIN information_schema.constraint_column_usage AS ccu
-                    ON ccu.constraint_name = tc.constraint_name
-                    AND ccu.table_schema = tc.table_schema
-                WHERE tc.constraint_type = 'FOREIGN KEY'
-                    AND tc.table_schema = :schema_name
-                    AND tc.table_name = :table_name
-            """)
-            fk_result = connection.execute(
-                fk_query,
-                {"schema_name": schema_name, "table_name": table_name}
-            )
-            foreign_keys = {
-                row[0]: {
-                    "table": f"{row[1]}.{row[2]}" if row[1] != 'public' else row[2],
-                    "column": row[3]
+    params = {"include_tables": include_tables}
+    
+    # Primary keys, foreign keys và indexes (một query trên pg_catalog)
+    pk_by_table = {}
+    fk_by_table = {}
+    idx_by_table = {}
+    
+    def collect_keys(rows: Sequence[Row]) -> None:
+        for row in rows:
+            kind = row[0]
+            key = (row[1], row[2])
+            if kind == 'p':
+                pk_by_table.setdefault(key, set()).add(row[4])
+            elif kind == 'f':
+                fk_by_table.setdefault(key, {})[row[4]] = {
+                    "table": f"{row[6]}.{row[7]}" if row[6] != 'public' else row[7],
+                    "column": row[8]
                 }
-                for row in fk_result
-            }
-            
-            # Lấy indexes
-            indexes_query = text("""
-                SELECT
-                    i.relname AS index_name,
-                    a.attname AS column_name,
-                    ix.indisunique AS is_unique
-                FROM pg_index ix
-                JOIN pg_class i ON i.oid = ix.indexrelid
-                JOIN pg_class t ON t.oid = ix.indrelid
-                JOIN pg_namespace n ON n.oid = t.relnamespace
-                JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = ANY(ix.indkey)
-                WHERE n.nspname = :schema_name
-                AND t.relname = :table_name
-                AND NOT ix.indisprimary
-            """)
-            indexes_result = connection.execute(
-                indexes_query,
-                {"schema_name": schema_name, "table_name": table_name}
-            )
-            indexes_dict = {}
-            for row in indexes_result:
-                idx_name = row[0]
+            else:
+                indexes_dict = idx_by_table.setdefault(key, {})
+                idx_name = row[3]
                 if idx_name not in indexes_dict:
                     indexes_dict[idx_name] = {
                         "name": idx_name,
                         "columns": [],
-                        "is_unique": row[2]
+                        "is_unique": row[5]
                     }
-                indexes_dict[idx_name]["columns"].append(row[1])
-            indexes = list(indexes_dict.values())
-            
-            # Lấy row count
-            count_query = text(f'SELECT COUNT(*) as count FROM "{schema_name}"."{table_name}"')
-            try:
-                count_result = connection.execute(count_query)
-                row_count = count_result.scalar()
-            except Exception as e:
-                logger.warning(f"Không thể lấy row count cho {full_table_name}: {e}")
-                row_count = None
-            
-            # Tạo ColumnInfo objects
-            column_infos = []
-            for col in columns_data:
-                col_name = col['column_name']
-                fk_info = foreign_keys.get(col_name)
-                
-                column_info = ColumnInfo(
-                    name=col_name,
-                    data_type=col['data_type'],
-                    is_nullable=col['is_nullable'] == 'YES',
-                    default_value=col['column_default'],
-                    character_maximum_length=col['character_maximum_length'],
-                    numeric_precision=col['numeric_precision'],
-                    numeric_scale=col['numeric_scale'],
-                    is_primary_key=col_name in primary_keys,
-                    is_foreign_key=fk_info is not None,
-                    foreign_key_table=fk_info['table'] if fk_info else None,
-                    foreign_key_column=fk_info['column'] if fk_info else None,
-                    description=col['description']
-                )
-                column_infos.append(column_info)
-            
-            # Tạo TableInfo
-            table_info = TableInfo(
-                table_name=full_table_name,
-                table_schema=schema_name,
-                columns=column_infos,
-                indexes=indexes,
-                row_count=row_count
+                indexes_dict[idx_name]["columns"].append(row[4])
+    
+    # Columns: result đã ORDER BY theo bảng; một bảng có thể trải qua nhiều partition,
+    # extend nối tiếp giữ đúng thứ tự cột
+    columns_by_table = {}
+    
+    def collect_columns(rows: Sequence[Row]) -> None:
+        for key, table_rows in groupby(rows, key=itemgetter(0, 1)):
+            columns_by_table.setdefault(key, []).extend(
+                [_build_column_dict(row[2:]) for row in table_rows]
             )
-            table_infos.append(table_info)
+    
+    # Các query metadata độc lập với nhau nên được gửi song song;
+    # columns và keys (lớn theo kích thước schema) được xử lý từng partition khi đang đọc
+    results = _fetch_concurrently(
+        engine,
+        {"tables": (_PG_TABLES_SQL, params)},
+        streams={
+            "keys": (_PG_KEYS_SQL, params, collect_keys),
+            "columns": (_PG_COLUMNS_SQL, params, collect_columns),
+        },
+    )
+    _apply_key_info(columns_by_table, pk_by_table, fk_by_table)
+    
+    # Danh sách tables (bao gồm schema) và views, tách theo table_type
+    # reltuples là số dòng ước lượng (cập nhật bởi VACUUM/ANALYZE), -1 nếu chưa analyze
+    tables = []
+    views = []
+    for row in results["tables"]:
+        schema_name = _intern(row[0])
+        if row[2] == 'VIEW':
+            views.append({
+                "schema": schema_name,
+                "name": f"{schema_name}.{row[1]}" if schema_name != 'public' else row[1],
+                "definition": row[4]
+            })
+        else:
+            tables.append({
+                "table_schema": schema_name,
+                "table_name": row[1],
+                "table_type": row[2],
+                "row_count": row[3] if row[3] is not None and row[3] >= 0 else None
+            })
+    
+    # Đếm chính xác (nếu được yêu cầu) song song trên các connection riêng
+    if exact_counts:
+        row_counts = _fetch_row_counts(
+            engine, [(row["table_schema"], row["table_name"]) for row in tables]
+        )
+        for row in tables:
+            row["row_count"] = row_counts[(row["table_schema"], row["table_name"])]
+    
+    table_infos = []
+    
+    for table_row in tables:
+        schema_name = table_row['table_schema']
+        table_name = table_row['table_name']
+        full_table_name = f"{schema_name}.{table_name}" if schema_name != 'public' else table_name
+        key = (schema_name, table_name)
         
-        # Lấy views
-        views_query = text("""
-            SELECT table_schema, table_name, view_definition
-            FROM information_schema.views
-            WHERE table_schema NOT IN ('information_schema', 'pg_catalog')
-            ORDER BY table_schema, table_name
-        """)
-        views_result = connection.execute(views_query)
-        views = [
-            {
-                "schema": row[0],
-                "name": f"{row[0]}.{row[1]}" if row[0] != 'public' else row[1],
-                "definition": row[2]
-            }
-            for row in views_result
-        ]
+        # Tạo table dict (cùng keys với TableInfo)
+        table_infos.append({
+            "table_name": full_table_name,
+            "table_schema": schema_name,
+            "columns": columns_by_table.get(key, []),
+            "indexes": list(idx_by_table.get(key, {}).values()),
+            "row_count": table_row['row_count'],
+            "description": None
+        })
     
-    # Tạo DatabaseSchema
-    schema = DatabaseSchema(
-        database_name=connector.database,
-        database_type="postgres",
-        host=connector.host,
-        port=connector.port,
-        tables=table_infos,
-        views=views,
-        metadata={
+    # Tạo schema document (cùng keys với DatabaseSchema)
+    schema = {
+        "database_name": connector.database,
+        "database_type": "postgres",
+        "host": connector.host,
+        "port": connector.port,
+        "tables": table_infos,
+        "views": views,
+        "extracted_at": datetime.utcnow(),
+        "fingerprint": None,
+        "metadata": {
             "user": connector.user,
             "extracted_by": "extract_database_schema"
         }
-    )
+    }
     
     return schema
 
 
 async def extract_mysql_schema(
-    connector: SQLDatabaseConnector
-) -> DatabaseSchema:
+    connector: SQLDatabaseConnector,
+    exact_counts: bool = False,
+    include_tables: Optional[List[str]] = None
+) -> Dict[str, Any]:
     """
     Trích xuất schema từ MySQL database.
     
     Args:
         connector: SQLDatabaseConnector instance
+        exact_counts: True để đếm chính xác bằng COUNT(*) (full scan từng bảng).
+            Mặc định dùng ước lượng information_schema.tables.table_rows.
+        include_tables: Chỉ trích xuất các bảng có tên trong danh sách (lọc ngay trong SQL).
+            None để lấy toàn bộ.
         
     Returns:
-        DatabaseSchema object chứa toàn bộ schema information
+        Schema document (dict cùng cấu trúc với DatabaseSchema) chứa toàn bộ schema information
     """
-    engine = create_engine(connector.db_uri)
+    # Các query SQLAlchemy là blocking, chạy trong worker thread để không chặn event loop
+    return await asyncio.to_thread(_extract_mysql_schema_sync, connector, exact_counts, include_tables)
+
+
+def _extract_mysql_schema_sync(
+    connector: SQLDatabaseConnector,
+    exact_counts: bool,
+    include_tables: Optional[List[str]]
+) -> Dict[str, Any]:
+    """Phần đồng bộ của extract_mysql_schema (chạy trong worker thread)."""
+    engine = _get_engine(connector.db_uri)
     
-    with engine.connect() as connection:
-        # Lấy danh sách tables
-        tables_query = text("""
-            SELECT table_schema, table_name
-            FROM information_schema.tables
-            WHERE table_schema = :db_name
-            AND table_type = 'BASE TABLE'
-            ORDER BY table_name
-        """)
-        tables_result = connection.execute(
-            tables_query,
-            {"db_name": connector.database}
-        )
-        tables = [{"table_schema": row[0], "table_name": row[1]} for row in tables_result]
-        
-        table_infos = []
-        
-        for table_row in tables:
-            table_name = table_row["table_name"]
-            
-            # Lấy columns
-            columns_query = text("""
-                SELECT 
-                    column_name,
-                    data_type,
-                    is_nullable,
-                    column_default,
-                    character_maximum_length,
-                    numeric_precision,
-                    numeric_scale,
-                    column_comment as description
-                FROM information_schema.columns
-                WHERE table_schema = :db_name AND table_name = :table_name
-                ORDER BY ordinal_position
-            """)
-            columns_result = connection.execute(
-                columns_query,
-                {"db_name": connector.database, "table_name": table_name}
-            )
-            columns_data = [
-                {
-                    "column_name": row[0],
-                    "data_type": row[1],
-                    "is_nullable": row[2],
-                    "column_default": row[3],
-                    "character_maximum_length": row[4],
-                    "numeric_precision": row[5],
-                    "numeric_scale": row[6],
-                    "description": row[7]
-                }
-                for row in columns_result
-            ]
-            
-            # Lấy primary keys
-            pk_query = text("""
-                SELECT column_name
-                FROM information_schema.key_column_usage
-                WHERE table_schema = :db_name
-                AND table_name = :table_name
-                AND constraint_name = 'PRIMARY'
-            """)
-            pk_result = connection.execute(
-                pk_query,
-                {"db_name": connector.database, "table_name": table_name}
-            )
-            primary_keys = {row[0] for row in pk_result}
-            
-            # Lấy foreign keys
-            fk_query = text("""
-                SELECT
-                    column_name,
-                    referenced_table_schema,
-                    referenced_table_name,
-                    referenced_column_name
-                FROM information_schema.key_column_usage
-                WHERE table_schema = :db_name
-                AND table_name = :table_name
-                AND referenced_table_name IS NOT NULL
-            """)
-            fk_result = connection.execute(
-                fk_query,
-                {"db_name": connector.database, "table_name": table_name}
+    params = {
+        "db_name": connector.database,
+        "include_tables": ",".join(include_tables) if include_tables is not None else None
+    }
+    
+    # Columns: result đã ORDER BY theo bảng; một bảng có thể trải qua nhiều partition,
+    # extend nối tiếp giữ đúng thứ tự cột
+    columns_by_table = {}
+    
+    def collect_columns(rows: Sequence[Row]) -> None:
+        for table_name, table_rows in groupby(rows, key=itemgetter(0)):
+            columns_by_table.setdefault(table_name, []).extend(
+                [_build_column_dict(row[1:]) for row in table_rows]
             )
-            foreign_keys = {
-                row[0]: {
-                    "table": row[2],
-                    "column": row[3]
+    
+    # Indexes
+    idx_by_table = {}
+    
+    def collect_indexes(rows: Sequence[Row]) -> None:
+        for row in rows:
+            indexes_dict = idx_by_table.setdefault(row[0], {})
+            idx_name = row[1]
+            if idx_name not in indexes_dict:
+                indexes_dict[idx_name] = {
+                    "name": idx_name,
+                    "columns": [],
+                    "is_unique": row[3] == 0
                 }
-                for row in fk_result
-            }
-            
-            # Lấy indexes
-            indexes_query = text("""
-                SELECT
-                    index_name,
-                    column_name,
-                    non_unique
-                FROM information_schema.statistics
-                WHERE table_schema = :db_name
-                AND table_name = :table_name
-                AND index_name != 'PRIMARY'
-                ORDER BY index_name, seq_in_index
-            """)
-            indexes_result = connection.execute(
-                indexes_query,
-                {"db_name": connector.database, "table_name": table_name}
-            )
-            indexes_dict = {}
-            for row in indexes_result:
-                idx_name = row[0]
-                if idx_name not in indexes_dict:
-                    indexes_dict[idx_name] = {
-                        "name": idx_name,
-                        "columns": [],
-                        "is_unique": row[2] == 0
-                    }
-                indexes_dict[idx_name]["columns"].append(row[1])
-            indexes = list(indexes_dict.values())
-            
-            # Lấy row count
-            count_query = text(f"SELECT COUNT(*) as count FROM `{table_name}`")
-            try:
-                count_result = connection.execute(count_query)
-                row_count = count_result.scalar()
-            except Exception as e:
-                logger.warning(f"Không thể lấy row count cho {table_name}: {e}")
-                row_count = None
-            
-            # Tạo ColumnInfo objects
-            column_infos = []
-            for col in columns_data:
-                col_name = col['column_name']
-                fk_info = foreign_keys.get(col_name)
-                
-                column_info = ColumnInfo(
-                    name=col_name,
-                    data_type=col['data_type'],
-                    is_nullable=col['is_nullable'] == 'YES',
-                    default_value=col['column_default'],
-                    character_maximum_length=col['character_maximum_length'],
-                    numeric_precision=col['numeric_precision'],
-                    numeric_scale=col['numeric_scale'],
-                    is_primary_key=col_name in primary_keys,
-                    is_foreign_key=fk_info is not None,
-                    foreign_key_table=fk_info['table'] if fk_info else None,
-                    foreign_key_column=fk_info['column'] if fk_info else None,
-                    description=col['description']
-                )
-                column_infos.append(column_info)
-            
-            # Tạo TableInfo
-            table_info = TableInfo(
-                table_name=table_name,
-                table_schema=connector.database,
-                columns=column_infos,
-                indexes=indexes,
-                row_count=row_count
-            )
-            table_infos.append(table_info)
-        
-        # Lấy views
-        views_query = text("""
-            SELECT table_name, view_definition
-            FROM information_schema.views
-            WHERE table_schema = :db_name
-            ORDER BY table_name
-        """)
-        views_result = connection.execute(
-            views_query,
-            {"db_name": connector.database}
-        )
-        views = [
-            {
+            indexes_dict[idx_name]["columns"].append(row[2])
+    
+    # Các query metadata độc lập với nhau nên được gửi song song;
+    # columns và indexes (lớn theo kích thước schema) được xử lý từng partition khi đang đọc
+    results = _fetch_concurrently(
+        engine,
+        {
+            "tables": (_MY_TABLES_SQL, params),
+            "pks": (_MY_PK_SQL, params),
+            "fks": (_MY_FK_SQL, params),
+        },
+        streams={
+            "columns": (_MY_COLUMNS_SQL, params, collect_columns),
+            "indexes": (_MY_INDEXES_SQL, params, collect_indexes),
+        },
+    )
+    
+    # Danh sách tables và views, tách theo table_type
+    # table_rows là số dòng ước lượng với InnoDB
+    tables = []
+    views = []
+    for row in results["tables"]:
+        if row[2] == 'VIEW':
+            views.append({
                 "schema": connector.database,
-                "name": row[0],
-                "definition": row[1]
-            }
-            for row in views_result
-        ]
+                "name": row[1],
+                "definition": row[4]
+            })
+        else:
+            tables.append({"table_schema": _intern(row[0]), "table_name": row[1], "row_count": row[3]})
+    
+    # Primary keys
+    pk_by_table = {}
+    for row in results["pks"]:
+        pk_by_table.setdefault(row[0], set()).add(row[1])
+    
+    # Foreign keys
+    fk_by_table = {}
+    for row in results["fks"]:
+        fk_by_table.setdefault(row[0], {})[row[1]] = {
+            "table": row[3],
+            "column": row[4]
+        }
+    
+    _apply_key_info(columns_by_table, pk_by_table, fk_by_table)
+    
+    # Đếm chính xác (nếu được yêu cầu) song song trên các connection riêng
+    if exact_counts:
+        row_counts = _fetch_row_counts(
+            engine, [(None, row["table_name"]) for row in tables]
+        )
+        for row in tables:
+            row["row_count"] = row_counts[(None, row["table_name"])]
+    
+    table_infos = []
     
-    # Tạo DatabaseSchema
-    schema = DatabaseSchema(
-        database_name=connector.database,
-        database_type="mysql",
-        host=connector.host,
-        port=connector.port,
-        tables=table_infos,
-        views=views,
-        metadata={
+    for table_row in tables:
+        table_name = table_row["table_name"]
+        
+        # Tạo table dict (cùng keys với TableInfo)
+        table_infos.append({
+            "table_name": table_name,
+            "table_schema": connector.database,
+            "columns": columns_by_table.get(table_name, []),
+            "indexes": list(idx_by_table.get(table_name, {}).values()),
+            "row_count": table_row['row_count'],
+            "description": None
+        })
+    
+    # Tạo schema document (cùng keys với DatabaseSchema)
+    schema = {
+        "database_name": connector.database,
+        "database_type": "mysql",
+        "host": connector.host,
+        "port": connector.port,
+        "tables": table_infos,
+        "views": views,
+        "extracted_at": datetime.utcnow(),
+        "fingerprint": None,
+        "metadata": {
             "user": connector.user,
             "extracted_by": "extract_database_schema"
         }
-    )
+    }
     
     return schema
 
 
-async def save_schema_to_mongodb(schema: DatabaseSchema) -> str:
+def _dump_schema(schema: Union[DatabaseSchema, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Serialize schema thành document MongoDB.
+    
+    Schema dạng dict (từ các hàm extract) được dùng trực tiếp, không qua pydantic.
+    Với DatabaseSchema, bỏ các field None (khi đọc lại, model dùng giá trị mặc định None).
+    """
+    if isinstance(schema, dict):
+        return {key: value for key, value in schema.items() if key not in ("id", "_id")}
+    return schema.model_dump(mode="python", exclude={"id"}, exclude_none=True, warnings=False)
+
+
+async def save_schema_to_mongodb(schema: Union[DatabaseSchema, Dict[str, Any]]) -> str:
     """
     Lưu schema vào MongoDB.
     
     Args:
-        schema: DatabaseSchema object
+        schema: DatabaseSchema object hoặc schema document (dict)
         
     Returns:
         ID của document đã lưu
@@ -469,60 +805,232 @@ async def save_schema_to_mongodb(schema: DatabaseSchema) -> str:
         raise RuntimeError("MongoDB chưa được kết nối. Gọi connect_to_mongo() trước.")
     
     collection = db.database_schemas
-    schema_dict = schema.model_dump(exclude={"id"})
+    schema_dict = _dump_schema(schema)
     
     result = await collection.insert_one(schema_dict)
+    # Schema mới nhất đã thay đổi
+    invalidate_schema_cache()
     return str(result.inserted_id)
 
 
-async def extract_and_save_schema(
-    db_type: Optional[str] = None,
-    connector: Optional[SQLDatabaseConnector] = None
-) -> str:
+async def save_schemas_to_mongodb(schemas: List[Union[DatabaseSchema, Dict[str, Any]]]) -> List[str]:
     """
-    Trích xuất schema từ SQL database và lưu vào MongoDB.
+    Lưu nhiều schema vào MongoDB trong một lần insert_many.
     
     Args:
-        db_type: Loại database ("postgres" hoặc "mysql"). Nếu None, tự động detect.
-        connector: SQLDatabaseConnector instance. Nếu None, tạo mới từ env.
+        schemas: Danh sách DatabaseSchema objects hoặc schema documents (dict)
         
     Returns:
-        ID của document đã lưu vào MongoDB
+        Danh sách ID của các document đã lưu (cùng thứ tự với schemas)
     """
-    # Kết nối MongoDB nếu chưa kết nối
+    if not schemas:
+        return []
+    
+    db = get_database()
+    if db is None:
+        raise RuntimeError("MongoDB chưa được kết nối. Gọi connect_to_mongo() trước.")
+    
+    collection = db.database_schemas
+    result = await collection.insert_many(
+        [_dump_schema(schema) for schema in schemas],
+        ordered=False
+    )
+    invalidate_schema_cache()
+    return [str(inserted_id) for inserted_id in result.inserted_ids]
+
+
+def _schema_cache_key(
+    connector: SQLDatabaseConnector,
+    include_tables: Optional[List[str]],
+    exact_counts: bool
+) -> Tuple[str, str, Optional[Tuple[str, ...]], bool]:
+    """Key của _extracted_schema_cache (schema khác nhau theo bộ lọc bảng và cách đếm row)."""
+    return (
+        connector.db_uri,
+        connector.database,
+        tuple(sorted(include_tables)) if include_tables is not None else None,
+        exact_counts
+    )
+
+
+async def _ensure_mongo_connection():
+    """Kết nối MongoDB nếu chưa kết nối."""
     try:
         from app.core.database import mongodb
         if mongodb.database is None:
             await connect_to_mongo()
     except Exception:
         await connect_to_mongo()
+
+
+async def _extract_schema(
+    connector: SQLDatabaseConnector,
+    exact_counts: bool = False,
+    refresh: bool = False,
+    include_tables: Optional[List[str]] = None
+) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Trích xuất schema của một database, bỏ qua nếu fingerprint không đổi.
     
-    # Tạo connector nếu chưa có
-    if connector is None:
-        connector = create_sql_connector(db_type=db_type)
-        if connector is None:
-            raise ValueError("Không thể tạo database connector. Kiểm tra environment variables.")
+    Returns:
+        (doc_id, None) nếu dùng lại document mới nhất trong MongoDB,
+        (None, schema) nếu vừa trích xuất schema mới (chưa lưu)
+    """
+    # Cache trong process: bỏ qua cả query fingerprint nếu vừa trích xuất gần đây
+    cache_key = _schema_cache_key(connector, include_tables, exact_counts)
+    if refresh:
+        _extracted_schema_cache.pop(cache_key)
+    else:
+        cached_doc_id = _extracted_schema_cache.get(cache_key)
+        if cached_doc_id is not None:
+            logger.info(f"Dùng lại schema document {cached_doc_id} từ cache")
+            return cached_doc_id, None
+    
+    # So sánh fingerprint với document mới nhất để bỏ qua trích xuất nếu schema không đổi
+    try:
+        fingerprint = await asyncio.to_thread(
+            _compute_schema_fingerprint, _get_engine(connector.db_uri), connector
+        )
+    except Exception as e:
+        logger.warning(f"Không thể tính schema fingerprint: {e}")
+        fingerprint = None
+    if fingerprint is not None and include_tables is not None:
+        # Cùng database nhưng khác bộ lọc bảng thì không được dùng lại document
+        fingerprint = f"{fingerprint}|tables={','.join(sorted(include_tables))}"
+    
+    # Fingerprint chỉ phản ánh cấu trúc, không phản ánh row count: exact_counts=True
+    # luôn trích xuất lại để không trả về document chứa row count ước lượng
+    if fingerprint is not None and not refresh and not exact_counts:
+        latest = await get_database().database_schemas.find_one(
+            {
+                "database_name": connector.database,
+                "database_type": connector.db_type,
+                "host": connector.host,
+                "port": connector.port,
+            },
+            projection={"fingerprint": 1},
+            sort=[("extracted_at", -1)]
+        )
+        if latest is not None and latest.get("fingerprint") == fingerprint:
+            logger.info(f"Schema không thay đổi, dùng lại document {latest['_id']}")
+            _extracted_schema_cache.set(cache_key, str(latest["_id"]))
+            return str(latest["_id"]), None
     
     logger.info(f"Bắt đầu trích xuất schema từ {connector.db_type} database: {connector.host}:{connector.port}/{connector.database}")
     
     # Trích xuất schema theo loại database
     if connector.db_type == "postgres":
-        schema = await extract_postgres_schema(connector)
+        schema = await extract_postgres_schema(
+            connector, exact_counts=exact_counts, include_tables=include_tables
+        )
     elif connector.db_type == "mysql":
-        schema = await extract_mysql_schema(connector)
+        schema = await extract_mysql_schema(
+            connector, exact_counts=exact_counts, include_tables=include_tables
+        )
     else:
         raise ValueError(f"Database type '{connector.db_type}' không được hỗ trợ")
     
-    logger.info(f"Đã trích xuất {len(schema.tables)} bảng, {len(schema.views)} views")
+    logger.info(f"Đã trích xuất {len(schema['tables'])} bảng, {len(schema['views'])} views")
+    schema["fingerprint"] = fingerprint
+    return None, schema
+
+
+async def extract_and_save_schema(
+    db_type: Optional[str] = None,
+    connector: Optional[SQLDatabaseConnector] = None,
+    exact_counts: bool = False,
+    refresh: bool = False,
+    include_tables: Optional[List[str]] = None
+) -> str:
+    """
+    Trích xuất schema từ SQL database và lưu vào MongoDB.
+    
+    Nếu fingerprint cấu trúc schema trùng với document mới nhất trong MongoDB thì
+    bỏ qua trích xuất và trả về ID của document đó.
+    
+    Args:
+        db_type: Loại database ("postgres" hoặc "mysql"). Nếu None, tự động detect.
+        connector: SQLDatabaseConnector instance. Nếu None, tạo mới từ env.
+        exact_counts: True để đếm row count chính xác bằng COUNT(*) thay vì ước lượng.
+        refresh: True để luôn trích xuất lại, bỏ qua cache và kiểm tra fingerprint.
+        include_tables: Chỉ trích xuất các bảng có tên trong danh sách. None để lấy toàn bộ.
+        
+    Returns:
+        ID của document đã lưu vào MongoDB
+    """
+    await _ensure_mongo_connection()
+    
+    # Tạo connector nếu chưa có
+    if connector is None:
+        connector = create_sql_connector(db_type=db_type)
+        if connector is None:
+            raise ValueError("Không thể tạo database connector. Kiểm tra environment variables.")
+    
+    existing_doc_id, schema = await _extract_schema(
+        connector, exact_counts=exact_counts, refresh=refresh, include_tables=include_tables
+    )
+    if existing_doc_id is not None:
+        return existing_doc_id
     
     # Lưu vào MongoDB
     doc_id = await save_schema_to_mongodb(schema)
+    _extracted_schema_cache.set(_schema_cache_key(connector, include_tables, exact_counts), doc_id)
     
     logger.info(f"Đã lưu schema vào MongoDB với ID: {doc_id}")
     
     return doc_id
 
 
+async def extract_and_save_schemas(
+    connectors: List[SQLDatabaseConnector],
+    concurrency: int = 4,
+    exact_counts: bool = False,
+    refresh: bool = False,
+    include_tables: Optional[List[str]] = None
+) -> List[str]:
+    """
+    Trích xuất song song schema của nhiều database và lưu vào MongoDB.
+    
+    Args:
+        connectors: Danh sách SQLDatabaseConnector
+        concurrency: Số database được trích xuất cùng lúc
+        exact_counts: True để đếm row count chính xác bằng COUNT(*) thay vì ước lượng.
+        refresh: True để luôn trích xuất lại, bỏ qua cache và kiểm tra fingerprint.
+        include_tables: Chỉ trích xuất các bảng có tên trong danh sách. None để lấy toàn bộ.
+        
+    Returns:
+        Danh sách ID document trong MongoDB (cùng thứ tự với connectors)
+    """
+    await _ensure_mongo_connection()
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def extract_one(connector: SQLDatabaseConnector):
+        async with semaphore:
+            return await _extract_schema(
+                connector, exact_counts=exact_counts, refresh=refresh, include_tables=include_tables
+            )
+    
+    async with asyncio.TaskGroup() as tg:
+        tasks = [tg.create_task(extract_one(connector)) for connector in connectors]
+    results = [task.result() for task in tasks]
+    
+    # Lưu các schema mới trong một lần insert_many
+    new_doc_ids = iter(await save_schemas_to_mongodb(
+        [schema for _, schema in results if schema is not None]
+    ))
+    doc_ids = [
+        existing_doc_id if existing_doc_id is not None else next(new_doc_ids)
+        for existing_doc_id, _ in results
+    ]
+    for connector, doc_id in zip(connectors, doc_ids):
+        _extracted_schema_cache.set(_schema_cache_key(connector, include_tables, exact_counts), doc_id)
+    
+    logger.info(f"Đã lưu schema của {len(doc_ids)} database vào MongoDB")
+    
+    return doc_ids
+
+
 async def main():
     """Entry point để chạy script từ command line."""
     logging.basicConfig(
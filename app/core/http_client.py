@@ -0,0 +1,49 @@
+"""
+httpx.AsyncClient dùng chung cho các OpenAI client (chat + embeddings).
+
+Mỗi ChatOpenAI/OpenAIEmbeddings mặc định tự tạo connection pool riêng, nên các lần gọi
+intent/plan/generate/correction trong cùng một request không dùng lại được kết nối
+của nhau. Dùng chung một pool để tái sử dụng kết nối TCP + TLS đến OpenAI.
+
+Client bật HTTP/2 (cần package h2, cài qua httpx[http2]): các request song song
+được multiplex trên cùng một kết nối thay vì mỗi request chiếm một kết nối HTTP/1.1.
+"""
+from typing import Optional
+
+import httpx
+
+# Giới hạn connection pool đến OpenAI API
+OPENAI_MAX_CONNECTIONS = 128
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = 64
+
+_openai_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_openai_http_client() -> httpx.AsyncClient:
+    """
+    Lấy httpx.AsyncClient dùng chung để truyền vào `http_async_client` của OpenAI client.
+    
+    Timeout do OpenAI SDK truyền theo từng request nên không cấu hình ở đây.
+    
+    Returns:
+        httpx.AsyncClient (tạo mới ở lần gọi đầu tiên hoặc sau khi đã đóng)
+    """
+    global _openai_http_client
+    if _openai_http_client is None or _openai_http_client.is_closed:
+        _openai_http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+            follow_redirects=True,
+            http2=True,
+        )
+    return _openai_http_client
+
+
+async def close_openai_http_client():
+    """Đóng connection pool dùng chung (gọi khi shutdown app)."""
+    global _openai_http_client
+    if _openai_http_client is not None:
+        await _openai_http_client.aclose()
+        _openai_http_client = None
@@ -1,45 +1,72 @@
 """
 Helper functions để xử lý knowledge base documents:
-- Load DOCX files sử dụng LangChain loaders
+- Load DOCX files sử dụng LangChain loaders (import lazy khi dùng lần đầu)
 - Convert DOCX -> Markdown để giữ format (tables, headers, lists)
 - Split markdown thành chunks với strategy đặc biệt cho tables
 - Tạo embeddings và lưu vào MongoDB
 """
+import hashlib
+import io
 import logging
-import tempfile
 import os
 import re
-from typing import List, Dict, Any, Optional, Tuple
+import threading
+from functools import cache
+from typing import List, Dict, Any, Optional, Tuple, BinaryIO
 from pathlib import Path
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter, MarkdownHeaderTextSplitter
-from langchain_community.document_loaders import Docx2txtLoader
 from langchain_core.documents import Document
-from langchain_community.document_transformers import MarkdownifyTransformer
+
+from app.core.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
 
-# Khởi tạo MarkdownifyTransformer để convert DOCX -> Markdown
-md_transformer = MarkdownifyTransformer()
-
-# Khởi tạo text splitter với config chuẩn cho project
-# Separators được tối ưu cho markdown: giữ nguyên table blocks
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000,
-    chunk_overlap=100,
-    add_start_index=True,
-    separators=["\n\n\n", "\n\n", "\n", ". ", " ", ""],  # Thêm "\n\n\n" để tách sections lớn
-)
-
-# Header splitter để split theo markdown headers trước
-header_splitter = MarkdownHeaderTextSplitter(
-    headers_to_split_on=[
-        ("#", "Header 1"),
-        ("##", "Header 2"),
-        ("###", "Header 3"),
-    ]
-)
+# Pattern nhận diện markdown table block (compile một lần khi load module)
+_TABLE_RE = re.compile(r'\|[^\n]*\|(?:\n\|[^\n]*\|)+')
+
+# Kết quả split theo headers theo hash nội dung (các file cùng template lặp lại nhiều section).
+# Cache theo từng process (không chia sẻ giữa các worker uvicorn); key là blake2b của text
+# (hashlib có sẵn, không thêm dependency xxhash).
+# TTLCache không thread-safe mà split chạy trong worker thread (asyncio.to_thread):
+# mọi get/set phải giữ _header_split_lock
+_header_split_cache = TTLCache(maxsize=256, ttl=3600)
+_header_split_lock = threading.Lock()
+
+
+# Các loader/transformer/splitter kéo theo nhiều dependency nặng (langchain_community,
+# markdownify, bs4...): chỉ import và khởi tạo ở lần dùng đầu tiên
+@cache
+def get_md_transformer():
+    """MarkdownifyTransformer để convert DOCX -> Markdown."""
+    from langchain_community.document_transformers import MarkdownifyTransformer
+    return MarkdownifyTransformer()
+
+
+@cache
+def get_text_splitter():
+    """Text splitter với config chuẩn cho project."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    # Separators được tối ưu cho markdown: giữ nguyên table blocks
+    return RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=100,
+        add_start_index=True,
+        separators=["\n\n\n", "\n\n", "\n", ". ", " ", ""],  # Thêm "\n\n\n" để tách sections lớn
+    )
+
+
+@cache
+def get_header_splitter():
+    """Header splitter để split theo markdown headers trước."""
+    from langchain_text_splitters import MarkdownHeaderTextSplitter
+    return MarkdownHeaderTextSplitter(
+        headers_to_split_on=[
+            ("#", "Header 1"),
+            ("##", "Header 2"),
+            ("###", "Header 3"),
+        ]
+    )
 
 
 def load_docx_file(file_path: str) -> List[Document]:
@@ -59,6 +86,8 @@ def load_docx_file(file_path: str) -> List[Document]:
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
     
+    from langchain_community.document_loaders import Docx2txtLoader
+    
     try:
         loader = Docx2txtLoader(file_path=file_path)
         documents = loader.load()
@@ -77,7 +106,7 @@ def load_docx_from_bytes(file_content: bytes, filename: str = "temp.docx") -> Li
     
     Args:
         file_content: Bytes content của file DOCX
-        filename: Tên file tạm (chỉ để debug)
+        filename: Tên file (dùng làm metadata source)
         
     Returns:
         List LangChain Document objects đã được convert sang Markdown
@@ -85,27 +114,48 @@ def load_docx_from_bytes(file_content: bytes, filename: str = "temp.docx") -> Li
     Raises:
         Exception: Nếu không thể load file
     """
-    # Tạo temporary file để Docx2txtLoader có thể đọc
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp_file:
-        tmp_file.write(file_content)
-        tmp_file_path = tmp_file.name
+    # Đọc trực tiếp từ bộ nhớ, không ghi ra temporary file
+    return load_docx_from_file_obj(io.BytesIO(file_content), filename)
+
+
+def load_docx_from_file_obj(file_obj: BinaryIO, filename: str = "temp.docx") -> List[Document]:
+    """
+    Load DOCX từ file object (ví dụ: file upload đã được spool) và convert sang Markdown.
     
-    try:
-        # Load DOCX
-        documents = load_docx_file(tmp_file_path)
-        
-        # Convert sang Markdown để giữ format (tables, headers, lists)
-        markdown_documents = md_transformer.transform_documents(documents)
+    Đọc trực tiếp từ file object, không cần ghi ra temporary file
+    hay đọc toàn bộ nội dung vào bytes.
+    
+    Args:
+        file_obj: File object (binary, seekable) chứa nội dung DOCX
+        filename: Tên file (dùng làm metadata source)
         
-        logger.info(
-            f"Converted DOCX to Markdown: {len(documents)} -> {len(markdown_documents)} documents"
-        )
+    Returns:
+        List LangChain Document objects đã được convert sang Markdown
         
-        return markdown_documents
-    finally:
-        # Xóa temporary file
-        if os.path.exists(tmp_file_path):
-            os.unlink(tmp_file_path)
+    Raises:
+        Exception: Nếu không thể load file
+    """
+    import docx2txt
+    
+    try:
+        file_obj.seek(0)
+        # Cùng cách Docx2txtLoader tạo Document, nhưng đọc từ file object
+        documents = [
+            Document(page_content=docx2txt.process(file_obj), metadata={"source": filename})
+        ]
+        logger.info(f"Loaded DOCX file: {len(documents)} documents from {filename}")
+    except Exception as e:
+        logger.error(f"Error loading DOCX file {filename}: {e}", exc_info=True)
+        raise
+    
+    # Convert sang Markdown để giữ format (tables, headers, lists)
+    markdown_documents = get_md_transformer().transform_documents(documents)
+    
+    logger.info(
+        f"Converted DOCX to Markdown: {len(documents)} -> {len(markdown_documents)} documents"
+    )
+    
+    return markdown_documents
 
 
 def detect_table_blocks(text: str) -> List[Tuple[int, int]]:
@@ -118,10 +168,13 @@ def detect_table_blocks(text: str) -> List[Tuple[int, int]]:
     Returns:
         List of tuples (start_index, end_index) cho mỗi table block
     """
-    table_pattern = r'\|[^\n]*\|(?:\n\|[^\n]*\|)+'
+    # Phần lớn section không có table: kiểm tra ký tự '|' (memchr) trước khi chạy regex
+    if '|' not in text:
+        return []
+    
     tables = []
     
-    for match in re.finditer(table_pattern, text):
+    for match in _TABLE_RE.finditer(text):
         start = match.start()
         end = match.end()
         tables.append((start, end))
@@ -150,55 +203,89 @@ def split_markdown_with_table_awareness(
         logger.warning("Empty documents list provided for splitting")
         return []
     
-    # Merge metadata vào documents trước khi split
-    if metadata:
-        for doc in documents:
-            if doc.metadata:
-                doc.metadata.update(metadata)
-            else:
-                doc.metadata = metadata.copy()
+    texts = [doc.page_content for doc in documents]
+    # Merge metadata bổ sung một lần cho mỗi document (không sửa documents đầu vào)
+    doc_metadatas = [{**(doc.metadata or {}), **(metadata or {})} for doc in documents]
     
-    all_chunks = []
+    all_chunks = [
+        chunk
+        for text, doc_metadata in zip(texts, doc_metadatas)
+        for chunk in _split_one_doc(text, doc_metadata)
+    ]
     
-    for doc in documents:
-        text = doc.page_content
-        doc_metadata = doc.metadata.copy() if doc.metadata else {}
-        
-        # Detect tables trong document
+    logger.info(f"Split {len(documents)} documents into {len(all_chunks)} chunks")
+    return all_chunks
+
+
+def _split_by_headers(text: str) -> Tuple[Document, ...]:
+    """
+    Split markdown theo headers, dùng lại kết quả nếu cùng nội dung đã được split
+    trong process hiện tại (cache in-memory, key blake2b 16 bytes của nội dung).
+    """
+    key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+    with _header_split_lock:
+        header_splits = _header_split_cache.get(key)
+    if header_splits is None:
+        # Split ngoài lock để các thread không chờ nhau; hai thread cùng miss chỉ split trùng
+        header_splits = tuple(get_header_splitter().split_text(text))
+        with _header_split_lock:
+            _header_split_cache.set(key, header_splits)
+    return header_splits
+
+
+def _split_one_doc(text: str, doc_metadata: Dict[str, Any]) -> List[Document]:
+    """
+    Split một markdown document thành chunks (theo headers, giữ nguyên tables).
+    """
+    # Detect tables trong document (chỉ để log debug, tránh quét regex thừa)
+    table_blocks = None
+    if logger.isEnabledFor(logging.DEBUG):
         table_blocks = detect_table_blocks(text)
         logger.debug(f"Found {len(table_blocks)} table blocks in document")
-        
-        # Strategy 1: Split theo headers trước (nếu có headers)
-        try:
-            header_splits = header_splitter.split_text(text)
-            if len(header_splits) > 1:
-                logger.info(f"Split document into {len(header_splits)} sections by headers")
-                # Mỗi header split là một section, tiếp tục split nhỏ hơn
-                for header_doc in header_splits:
-                    section_text = header_doc.page_content
-                    section_metadata = {**doc_metadata, **(header_doc.metadata or {})}
-                    
-                    # Split section thành chunks nhỏ hơn (nhưng giữ tables)
-                    section_chunks = _split_section_preserving_tables(
-                        section_text, section_metadata
-                    )
-                    all_chunks.extend(section_chunks)
-            else:
-                # Không có headers, split trực tiếp
-                chunks = _split_section_preserving_tables(text, doc_metadata)
-                all_chunks.extend(chunks)
-        except Exception as e:
-            logger.warning(f"Header splitting failed, falling back to direct split: {e}")
-            # Fallback: split trực tiếp
-            chunks = _split_section_preserving_tables(text, doc_metadata)
-            all_chunks.extend(chunks)
     
-    logger.info(f"Split {len(documents)} documents into {len(all_chunks)} chunks")
-    return all_chunks
+    # Strategy 1: Split theo headers trước (nếu có headers)
+    try:
+        header_splits = _split_by_headers(text)
+        if len(header_splits) > 1:
+            logger.info(f"Split document into {len(header_splits)} sections by headers")
+            chunks = []
+            # Mỗi header split là một section, tiếp tục split nhỏ hơn
+            for header_doc in header_splits:
+                section_text = header_doc.page_content
+                section_metadata = {**doc_metadata, **(header_doc.metadata or {})}
+                
+                # Split section thành chunks nhỏ hơn (nhưng giữ tables)
+                chunks.extend(_split_section_preserving_tables(section_text, section_metadata))
+            return chunks
+        # Không có headers, split trực tiếp (dùng lại table blocks nếu đã detect)
+        return _split_section_preserving_tables(text, doc_metadata, table_blocks)
+    except Exception as e:
+        logger.warning(f"Header splitting failed, falling back to direct split: {e}")
+        # Fallback: split trực tiếp
+        return _split_section_preserving_tables(text, doc_metadata, table_blocks)
+
+
+def _split_text(text: str, metadata: Dict[str, Any]) -> List[Document]:
+    """
+    Split một đoạn text (không chứa table) thành chunks bằng text_splitter.
+    
+    Đoạn text đã vừa một chunk thì tạo Document trực tiếp (cùng kết quả với
+    text_splitter), không phải chạy vòng split/merge theo separators.
+    """
+    text_splitter = get_text_splitter()
+    stripped = text.strip()
+    if not stripped:
+        return []
+    if len(stripped) <= text_splitter._chunk_size:
+        chunk_metadata = {**metadata, "start_index": text.find(stripped)}
+        return [Document(page_content=stripped, metadata=chunk_metadata)]
+    return text_splitter.create_documents([text], metadatas=[metadata])
 
 
 def _split_section_preserving_tables(
-    text: str, metadata: Dict[str, Any]
+    text: str,
+    metadata: Dict[str, Any],
+    table_blocks: Optional[List[Tuple[int, int]]] = None,
 ) -> List[Document]:
     """
     Split một section markdown thành chunks, giữ nguyên table blocks.
@@ -208,13 +295,18 @@ def _split_section_preserving_tables(
     - Split text giữa các tables
     - Mỗi chunk có thể chứa: text trước table + table + text sau table
     - Nếu table quá lớn (> chunk_size), giữ nguyên và đánh dấu
+    
+    Args:
+        text: Markdown text của section
+        metadata: Metadata cho mỗi chunk
+        table_blocks: Table blocks đã detect trên chính text này (None để tự detect)
     """
-    table_blocks = detect_table_blocks(text)
+    if table_blocks is None:
+        table_blocks = detect_table_blocks(text)
     
     if not table_blocks:
         # Không có tables, split bình thường
-        chunks = text_splitter.create_documents([text], metadatas=[metadata])
-        return chunks
+        return _split_text(text, metadata)
     
     # Có tables, cần xử lý đặc biệt
     chunks = []
@@ -228,16 +320,12 @@ def _split_section_preserving_tables(
         
         if text_before:
             # Split text trước table
-            before_chunks = text_splitter.create_documents(
-                [text_before], metadatas=[metadata]
-            )
+            before_chunks = _split_text(text_before, metadata)
             chunks.extend(before_chunks)
         
         # Table block: giữ nguyên (không split)
         # Nếu table quá lớn, vẫn giữ nguyên và đánh dấu
-        table_metadata = metadata.copy()
-        table_metadata["has_table"] = True
-        table_metadata["table_size"] = len(table_text)
+        table_metadata = {**metadata, "has_table": True, "table_size": len(table_text)}
         
         table_chunk = Document(page_content=table_text, metadata=table_metadata)
         chunks.append(table_chunk)
@@ -247,9 +335,7 @@ def _split_section_preserving_tables(
     # Text sau table cuối cùng
     text_after = text[last_end:].strip()
     if text_after:
-        after_chunks = text_splitter.create_documents(
-            [text_after], metadatas=[metadata]
-        )
+        after_chunks = _split_text(text_after, metadata)
         chunks.extend(after_chunks)
     
     return chunks
@@ -282,16 +368,13 @@ def split_documents_into_chunks(
         # Dùng markdown-aware splitting (giữ tables)
         return split_markdown_with_table_awareness(documents, metadata)
     else:
-        # Split bình thường (fallback)
-        if metadata:
-            for doc in documents:
-                if doc.metadata:
-                    doc.metadata.update(metadata)
-                else:
-                    doc.metadata = metadata.copy()
-        
+        # Split bình thường (fallback), metadata được merge khi tạo chunks
+        text_splitter = get_text_splitter()
         try:
-            chunked_docs = text_splitter.split_documents(documents)
+            chunked_docs = text_splitter.create_documents(
+                [doc.page_content for doc in documents],
+                metadatas=[{**(doc.metadata or {}), **(metadata or {})} for doc in documents],
+            )
             logger.info(
                 f"Split {len(documents)} documents into {len(chunked_docs)} chunks "
                 f"(chunk_size={text_splitter._chunk_size}, overlap={text_splitter._chunk_overlap})"
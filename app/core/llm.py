@@ -0,0 +1,34 @@
+"""
+Dùng chung ChatOpenAI client trong toàn bộ app.
+
+Graph và các retriever (rerank) đều dùng gpt-4o-mini với cùng cấu hình, nên giữ
+một instance cho mỗi (model, temperature) thay vì mỗi nơi tự tạo một client.
+"""
+from functools import lru_cache
+
+from langchain_openai import ChatOpenAI
+
+from app.core.config import settings
+from app.core.http_client import get_openai_http_client
+
+DEFAULT_CHAT_MODEL = "gpt-4o-mini"
+
+
+@lru_cache(maxsize=8)
+def get_chat_model(temperature: float = 0.7, model_name: str = DEFAULT_CHAT_MODEL) -> ChatOpenAI:
+    """
+    Lấy ChatOpenAI instance dùng chung cho model và temperature.
+    
+    Args:
+        temperature: Temperature của model
+        model_name: Tên chat model
+        
+    Returns:
+        ChatOpenAI instance (tạo mới ở lần gọi đầu tiên)
+    """
+    return ChatOpenAI(
+        model_name=model_name,
+        temperature=temperature,
+        openai_api_key=settings.openai_api_key,
+        http_async_client=get_openai_http_client(),
+    )
@@ -4,11 +4,12 @@ Hỗ trợ PostgreSQL và MySQL
 """
 import os
 import logging
+from functools import lru_cache
 from typing import Optional, Dict, Any, List, Tuple
-from urllib.parse import quote
 from dotenv import load_dotenv
 
-from sqlalchemy import text as sa_text
+from sqlalchemy import TextClause, text as sa_text
+from sqlalchemy.engine import URL
 from langchain_community.utilities import SQLDatabase
 # Try both import names for compatibility
 try:
@@ -17,6 +18,7 @@ except ImportError:
     # Fallback to old naming (pre-Dec 2024)
     from langchain_community.tools.sql_database.tool import QuerySQLDataBaseTool as QuerySQLDatabaseTool
 
+from app.core.cache import TTLCache
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -24,6 +26,19 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# Thời gian cache (giây) cho danh sách bảng và schema (DDL) của bảng
+TABLES_CACHE_TTL = 60
+SCHEMA_CACHE_TTL = 300
+
+# Số TextClause được giữ lại cho các câu query lặp lại
+STATEMENT_CACHE_SIZE = 256
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def _text_clause(query: str) -> TextClause:
+    """TextClause cho câu query (dùng lại cùng object khi query lặp lại)"""
+    return sa_text(query)
+
 
 class SQLDatabaseConnector:
     """
@@ -92,35 +107,51 @@ class SQLDatabaseConnector:
                 f"Vui lòng cung cấp qua parameters hoặc environment variables."
             )
         
-        # Tạo connection URI
-        self.db_uri = self._build_connection_uri()
+        # Tạo connection URL (db_uri là dạng chuỗi, dùng làm key cache/engine)
+        self.db_url = self._build_connection_url()
+        self.db_uri = self.db_url.render_as_string(hide_password=False)
+        
+        # Cache danh sách bảng và schema theo tuple tên bảng (schema ít thay đổi)
+        self._tables_cache = TTLCache(maxsize=1, ttl=TABLES_CACHE_TTL)
+        self._schema_cache = TTLCache(maxsize=128, ttl=SCHEMA_CACHE_TTL)
         
         # Kết nối database
         try:
-            self.db = SQLDatabase.from_uri(database_uri=self.db_uri)
+            # Pool giữ connection sẵn giữa các query; pre_ping/recycle tránh dùng connection đã chết
+            self.db = SQLDatabase.from_uri(
+                database_uri=self.db_url,
+                engine_args={
+                    "pool_size": settings.query_pool_size,
+                    "max_overflow": settings.query_max_overflow,
+                    "pool_pre_ping": settings.query_pool_pre_ping,
+                    "pool_recycle": settings.query_pool_recycle,
+                    "query_cache_size": settings.query_compiled_cache_size,
+                },
+            )
             self.sql_tool = QuerySQLDatabaseTool(db=self.db)
             logger.info(f"Đã kết nối thành công đến {self.db_type} database: {self.host}:{self.port}/{self.database}")
         except Exception as e:
             logger.error(f"Lỗi kết nối database: {e}")
             raise
     
-    def _build_connection_uri(self) -> str:
-        """Xây dựng connection URI từ thông tin kết nối"""
-        # Encode password để xử lý các ký tự đặc biệt
-        encoded_password = quote(str(self.password))
-        
+    def _build_connection_url(self) -> URL:
+        """Xây dựng connection URL từ thông tin kết nối"""
+        # URL.create tự escape các ký tự đặc biệt trong user/password/database
         if self.db_type == "postgres":
-            return (
-                f"postgresql://{self.user}:{encoded_password}@"
-                f"{self.host}:{self.port}/{self.database}"
-            )
+            drivername = "postgresql+psycopg2"
         elif self.db_type == "mysql":
-            return (
-                f"mysql+pymysql://{self.user}:{encoded_password}@"
-                f"{self.host}:{self.port}/{self.database}"
-            )
+            drivername = "mysql+pymysql"
         else:
             raise ValueError(f"Database type '{self.db_type}' không được hỗ trợ")
+        
+        return URL.create(
+            drivername=drivername,
+            username=self.user,
+            password=str(self.password),
+            host=self.host,
+            port=int(self.port) if self.port else None,
+            database=self.database,
+        )
     
     def execute_query(self, query: str) -> Dict[str, Any]:
         """
@@ -149,14 +180,11 @@ class SQLDatabaseConnector:
             logger.debug(f"Thực thi query (structured): {query[:100]}...")
             # Truy vấn trực tiếp qua SQLAlchemy engine bên trong SQLDatabase
             with self.db._engine.connect() as conn:  # type: ignore[attr-defined]
-                result = conn.execute(sa_text(query))
+                result = conn.execute(_text_clause(query))
                 rows_raw = result.fetchall()
                 columns = list(result.keys())
 
-            rows: List[Dict[str, Any]] = [
-                {col: value for col, value in zip(columns, row)}
-                for row in rows_raw
-            ]
+            rows: List[Dict[str, Any]] = [dict(zip(columns, row)) for row in rows_raw]
 
             return {"columns": columns, "rows": rows}
         except Exception as e:
@@ -194,8 +222,12 @@ class SQLDatabaseConnector:
         List[str]
             Danh sách tên các bảng
         """
+        tables = self._tables_cache.get("tables")
+        if tables is not None:
+            return list(tables)
         try:
             tables = self.db.get_usable_table_names()
+            self._tables_cache.set("tables", tuple(tables))
             return tables
         except Exception as e:
             logger.error(f"Lỗi khi lấy danh sách bảng: {e}")
@@ -216,8 +248,7 @@ class SQLDatabaseConnector:
             Schema của bảng (DDL)
         """
         try:
-            schema = self.db.get_table_info_no_throw([table_name])
-            return schema
+            return self._get_table_info((table_name,))
         except Exception as e:
             logger.error(f"Lỗi khi lấy schema của bảng {table_name}: {e}")
             raise
@@ -239,12 +270,24 @@ class SQLDatabaseConnector:
         try:
             if table_names is None:
                 table_names = self.get_tables()
-            schema = self.db.get_table_info_no_throw(table_names)
-            return schema
+            return self._get_table_info(tuple(sorted(table_names)))
         except Exception as e:
             logger.error(f"Lỗi khi lấy schema: {e}")
             raise
     
+    def _get_table_info(self, table_names: Tuple[str, ...]) -> str:
+        """Lấy schema (DDL) của các bảng, dùng cache theo tuple tên bảng"""
+        schema = self._schema_cache.get(table_names)
+        if schema is None:
+            schema = self.db.get_table_info_no_throw(list(table_names))
+            self._schema_cache.set(table_names, schema)
+        return schema
+    
+    def reset_schema_cache(self):
+        """Xóa cache danh sách bảng và schema (gọi sau khi thay đổi DDL)"""
+        self._tables_cache.clear()
+        self._schema_cache.clear()
+    
     def get_database_instance(self) -> SQLDatabase:
         """
         Lấy instance SQLDatabase của langchain
@@ -277,8 +320,8 @@ class SQLDatabaseConnector:
             True nếu kết nối thành công
         """
         try:
-            # Thử lấy danh sách bảng để kiểm tra kết nối
-            self.get_tables()
+            # Thử lấy danh sách bảng để kiểm tra kết nối (không dùng cache)
+            self.db.get_usable_table_names()
             return True
         except Exception as e:
             logger.error(f"Kết nối database thất bại: {e}")
@@ -1,7 +1,7 @@
 """
 Graph module chứa các LangGraph definitions.
 """
-from .graph import Graph, GraphState, graph
+from .graph import Graph, GraphState, get_graph
 
-__all__ = ["Graph", "GraphState", "graph"]
+__all__ = ["Graph", "GraphState", "get_graph"]
 
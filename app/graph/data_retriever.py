@@ -3,15 +3,19 @@ from langchain.retrievers.document_compressors import LLMListwiseRerank
 from langchain.retrievers import ContextualCompressionRetriever
 from langchain.tools.retriever import create_retriever_tool
 from langchain_openai import ChatOpenAI
+from langchain_core.retrievers import BaseRetriever
 from langchain_core.vectorstores import VectorStore
 from langchain_community.vectorstores import FAISS
 
-from app.core.config import settings
+from app.core.llm import get_chat_model
 from app.graph.load_schema_embeddings import create_vectorstore_from_embeddings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Relevance score (0-1) tối thiểu để một bảng được đưa vào prompt rerank của LLM
+LLM_RERANK_MIN_SCORE = 0.5
+
 
 class DataRetriever:
     """Helper class quản lý data retriever cho node retriever bảng trong graph."""
@@ -20,65 +24,35 @@ class DataRetriever:
         self,
         data_vectorstore: Optional[VectorStore] = None,
         llm: Optional[ChatOpenAI] = None,
-        schema_doc_id: Optional[str] = None,
-        auto_load_embeddings: bool = True,
+        use_llm_rerank: bool = False,
     ):
         """
         Args:
-            data_vectorstore: Vectorstore chứa thông tin về database schema/tables.
-                Nếu None và auto_load_embeddings=True, sẽ tự động load từ MongoDB.
+            data_vectorstore: Vectorstore chứa thông tin về database schema/tables
+                (đã load sẵn). Để load từ MongoDB, dùng create_with_embeddings().
             llm: LLM instance để dùng cho reranking
-            schema_doc_id: ID của schema document để load embeddings.
-                Nếu None, sẽ load embeddings mới nhất.
-            auto_load_embeddings: Nếu True, tự động load embeddings từ MongoDB nếu
-                data_vectorstore là None.
+            use_llm_rerank: Nếu True, lấy 50 candidates rồi rerank bằng LLM (thêm một lần
+                gọi LLM mỗi query). Mặc định chỉ dùng MMR lấy trực tiếp top 10.
         """
-        self.llm = llm or ChatOpenAI(
-            model_name="gpt-4o-mini",
-            temperature=0.7,
-            openai_api_key=settings.openai_api_key,
-        )
+        self.llm = llm or get_chat_model(temperature=0.7)
+        self.data_vectorstore = data_vectorstore
+        self.use_llm_rerank = use_llm_rerank
         
-        # Nếu không có vectorstore và auto_load=True, thử load từ MongoDB
-        if data_vectorstore is None and auto_load_embeddings:
-            try:
-                # Import ở đây để tránh circular import
-                import asyncio
-                
-                # Tạo event loop nếu chưa có
-                try:
-                    loop = asyncio.get_event_loop()
-                except RuntimeError:
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                
-                # Load vectorstore từ MongoDB
-                if loop.is_running():
-                    # Nếu đang trong async context, cần dùng create_task hoặc await
-                    logger.warning(
-                        "Event loop đang chạy, không thể load embeddings đồng bộ. "
-                        "Sử dụng load_vectorstore_async() hoặc truyền data_vectorstore trực tiếp."
-                    )
-                    self.data_vectorstore = None
-                else:
-                    self.data_vectorstore = loop.run_until_complete(
-                        create_vectorstore_from_embeddings(schema_doc_id=schema_doc_id)
-                    )
-                    if self.data_vectorstore:
-                        logger.info("Đã load vectorstore từ MongoDB embeddings")
-                    else:
-                        logger.warning("Không thể load vectorstore từ MongoDB embeddings")
-            except Exception as e:
-                logger.warning(f"Không thể tự động load embeddings từ MongoDB: {e}")
-                self.data_vectorstore = None
-        else:
-            self.data_vectorstore = data_vectorstore
+        # Retriever và tool chỉ phụ thuộc vào data_vectorstore và llm: tạo một lần rồi dùng lại
+        self._retriever: Optional[BaseRetriever] = None
+        self._tool = None
+    
+    def invalidate(self):
+        """Xóa retriever/tool đã tạo (gọi sau khi thay data_vectorstore hoặc llm)."""
+        self._retriever = None
+        self._tool = None
     
     @classmethod
     async def create_with_embeddings(
         cls,
         schema_doc_id: Optional[str] = None,
         llm: Optional[ChatOpenAI] = None,
+        use_llm_rerank: bool = False,
     ) -> "DataRetriever":
         """
         Factory method để tạo DataRetriever với embeddings từ MongoDB (async).
@@ -86,41 +60,55 @@ class DataRetriever:
         Args:
             schema_doc_id: ID của schema document. Nếu None, load embeddings mới nhất.
             llm: LLM instance để dùng cho reranking
+            use_llm_rerank: Nếu True, rerank candidates bằng LLM
             
         Returns:
             DataRetriever instance với vectorstore đã được load
         """
         vectorstore = await create_vectorstore_from_embeddings(schema_doc_id=schema_doc_id)
-        return cls(data_vectorstore=vectorstore, llm=llm, auto_load_embeddings=False)
+        return cls(data_vectorstore=vectorstore, llm=llm, use_llm_rerank=use_llm_rerank)
 
-    def get_data_retriever(self) -> Optional[ContextualCompressionRetriever]:
+    def get_data_retriever(self) -> Optional[BaseRetriever]:
         """
-        Tạo compression retriever từ data_vectorstore với reranking.
+        Tạo retriever từ data_vectorstore.
+        
+        Mặc định dùng MMR lấy trực tiếp top 10 (không gọi LLM). Nếu use_llm_rerank,
+        lấy tối đa 50 candidates có relevance score >= LLM_RERANK_MIN_SCORE rồi rerank
+        bằng LLMListwiseRerank (không có candidate nào thì không gọi LLM).
         
         Returns:
-            ContextualCompressionRetriever hoặc None nếu không có vectorstore
+            Retriever (ContextualCompressionRetriever nếu rerank bằng LLM) hoặc None
+            nếu không có vectorstore
         """
-        retriever = (
-            self.data_vectorstore.as_retriever(
+        if self._retriever is not None:
+            return self._retriever
+        
+        if self.data_vectorstore is None:
+            logger.warning("Data vectorstore is None, cannot create retriever")
+            return None
+        
+        if not self.use_llm_rerank:
+            self._retriever = self.data_vectorstore.as_retriever(
                 search_type="mmr",
-                search_kwargs={"k": 50, "lambda_mult": 0.25}
+                search_kwargs={"k": 10, "fetch_k": 50, "lambda_mult": 0.25}
             )
-            if self.data_vectorstore
-            else None
+            return self._retriever
+        
+        # LLMListwiseRerank không có tham số min_score: lọc score ngay ở bước lấy candidates
+        # để các bảng ít liên quan không vào prompt rerank
+        retriever = self.data_vectorstore.as_retriever(
+            search_type="similarity_score_threshold",
+            search_kwargs={"k": 50, "score_threshold": LLM_RERANK_MIN_SCORE}
         )
 
-        if retriever is None:
-            logger.warning("Data vectorstore is None, cannot create retriever")
-            return None
-
         # Sử dụng LLMListwiseRerank để rerank kết quả
         compressor = LLMListwiseRerank.from_llm(llm=self.llm, top_n=10)
 
-        compression_retriever = ContextualCompressionRetriever(
+        self._retriever = ContextualCompressionRetriever(
             base_compressor=compressor, base_retriever=retriever
         )
 
-        return compression_retriever
+        return self._retriever
 
     def get_data_retriever_tool(self):
         """
@@ -129,12 +117,15 @@ class DataRetriever:
         Returns:
             Tool từ create_retriever_tool hoặc None
         """
+        if self._tool is not None:
+            return self._tool
+        
         retriever = self.get_data_retriever()
         if retriever is None:
             logger.warning("Cannot create data retriever tool: retriever is None")
             return None
 
-        return create_retriever_tool(
+        self._tool = create_retriever_tool(
             retriever,
             name="data_retriever",
             description=(
@@ -144,4 +135,5 @@ class DataRetriever:
             ),
             response_format="content_and_artifact",
         )
+        return self._tool
 
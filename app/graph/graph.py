@@ -1,13 +1,25 @@
-from typing import TypedDict, Annotated, List, Dict, Any, Optional
+import asyncio
+import difflib
+import hashlib
+import json
+import re
+from typing import TypedDict, Annotated, List, Dict, Any, Optional, Tuple, Type
+from functools import lru_cache
+from itertools import islice
 from operator import add
 
 from langgraph.graph import StateGraph, END
 from langchain_openai import ChatOpenAI
 from langchain.schema import HumanMessage, AIMessage, SystemMessage
 from langchain_core.documents import Document
-from app.prompts.intent_prompt import INTENT_CLASSIFICATION_PROMPT
-from app.prompts.sql_planning_prompt import SQL_PLANNING_SYSTEM_PROMPT, SQL_PLANNING_USER_PROMPT
-from app.prompts.sql_generation_prompt import SQL_GENERATION_SYSTEM_PROMPT, SQL_GENERATION_USER_PROMPT
+from app.prompts.intent_prompt import INTENT_CLASSIFICATION_PROMPT, INTENT_BATCH_USER_PROMPT
+from app.prompts.sql_generation_prompt import (
+    SQL_GENERATION_SYSTEM_PROMPT,
+    SQL_GENERATION_SCHEMA_PROMPT,
+    SQL_GENERATION_USER_PROMPT,
+    SQL_PLAN_AND_GENERATION_SYSTEM_PROMPT,
+    SQL_PLAN_AND_GENERATION_USER_PROMPT,
+)
 from app.prompts.sql_correction_prompt import (
     SQL_CORRECTION_SYSTEM_PROMPT,
     SQL_CORRECTION_USER_PROMPT,
@@ -16,25 +28,122 @@ from app.prompts.out_of_scope_prompt import (
     OUT_OF_SCOPE_SYSTEM_PROMPT,
     OUT_OF_SCOPE_USER_PROMPT,
 )
-from app.schemas.intent_classifier import IntentClassifierSchema
-from app.schemas.sql_generation import SQLGenerationSchema
+from app.schemas.intent_classifier import IntentClassifierSchema, IntentBatchSchema
+from app.schemas.sql_generation import SQLGenerationSchema, SQLPlanAndGenerationSchema
 from app.schemas.sql_correction import SQLCorrectionSchema
 from app.graph.data_retriever import DataRetriever
 from app.graph.knowledge_base_retriever import KnowledgeBaseRetriever
 from app.graph.schema_helper import get_table_schemas_from_retrieved_docs
+from app.graph.intent_cache import SemanticIntentCache
+from app.graph.intent_batcher import IntentBatcher
+from app.graph.llm_cache import LLMCache
+from app.core.cache import TTLCache
+from app.core.embeddings import get_embedding_client
+from app.core.llm import get_chat_model
 from app.core.sql_database import get_sql_connector
-
-try:
-    from langchain_community.callbacks import get_openai_callback
-except ImportError:
-    from langchain.callbacks import get_openai_callback
-
 from app.core.config import settings
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Embedding model (nhỏ, rẻ) dùng để tra cache intent theo ngữ nghĩa
+INTENT_CACHE_EMBEDDING_MODEL = "text-embedding-3-small"
+# Ngưỡng cosine similarity để dùng lại intent của query đã phân loại
+INTENT_CACHE_SIMILARITY = 0.92
+
+# Câu hỏi ngắn (tính theo số từ, tiếng Việt tách theo âm tiết) và không có dấu hiệu
+# truy vấn phức tạp thì sinh SQL trực tiếp, không cần lập kế hoạch
+SIMPLE_QUERY_MAX_WORDS = 12
+COMPLEX_QUERY_KEYWORDS = (
+    "join",
+    "group by",
+    "having",
+    "except",
+    "window",
+    "so sánh",
+    "theo từng",
+    "nhóm theo",
+    "tỷ lệ",
+    "xếp hạng",
+    "trung bình",
+)
+# sql_plan dùng cho generate_sql khi không lập kế hoạch
+SQL_PLAN_SKIPPED = "(Câu hỏi đơn giản, không lập kế hoạch: sinh SQL trực tiếp từ câu hỏi và schema.)"
+
+# Cache SQL đã thực thi thành công theo (schema của các bảng liên quan, câu hỏi đã chuẩn hoá)
+SQL_CACHE_MAX_SIZE = 1024
+SQL_CACHE_TTL = 3600
+
+# Số dòng kết quả SQL tối đa hiển thị trong response
+FORMAT_MAX_ROWS = 50
+
+# prompt_cache_key gửi lên OpenAI cho từng loại prompt, để các request cùng system prompt
+# được định tuyến về cùng cache prefix. Tăng hậu tố version khi sửa nội dung prompt.
+PROMPT_CACHE_KEY_INTENT = "intent-v1"
+PROMPT_CACHE_KEY_SQL_PLAN_AND_GEN = "sql-plan-gen-v1"
+PROMPT_CACHE_KEY_SQL_GEN = "sql-gen-v2"
+PROMPT_CACHE_KEY_SQL_CORR = "sql-corr-v1"
+PROMPT_CACHE_KEY_OUT_OF_SCOPE = "out-of-scope-v1"
+
+# System prompt không đổi giữa các lần gọi: tạo message một lần và dùng chung
+_SYS_INTENT = SystemMessage(content=INTENT_CLASSIFICATION_PROMPT)
+_SYS_PLAN_AND_GEN = SystemMessage(content=SQL_PLAN_AND_GENERATION_SYSTEM_PROMPT)
+_SYS_GEN = SystemMessage(content=SQL_GENERATION_SYSTEM_PROMPT)
+_SYS_CORR = SystemMessage(content=SQL_CORRECTION_SYSTEM_PROMPT)
+_SYS_OOS = SystemMessage(content=OUT_OF_SCOPE_SYSTEM_PROMPT)
+
+# Nhóm lỗi SQL theo nội dung error message, kiểm tra theo thứ tự (nhóm đầu tiên khớp)
+_SQL_ERROR_CATEGORY_PATTERNS = [
+    (
+        "table_or_column_not_found",
+        re.compile(
+            r"does not exist|unknown (?:table|column)|undefined (?:table|column)|no such (?:table|column)",
+            re.IGNORECASE,
+        ),
+    ),
+    (
+        "syntax_error",
+        re.compile(r"syntax error|parse error|at or near|sqlstate 42601", re.IGNORECASE),
+    ),
+    (
+        "type_mismatch",
+        re.compile(
+            r"type mismatch|cannot cast|invalid input syntax|data type mismatch|sqlstate 42804",
+            re.IGNORECASE,
+        ),
+    ),
+    (
+        "permission_or_connection",
+        re.compile(
+            r"permission denied|access denied|sqlstate 42501|\brole\b|not authorized"
+            r"|connection refused|could not connect|timeout",
+            re.IGNORECASE,
+        ),
+    ),
+]
+
+# Intent hợp lệ (tên nhánh sau classify_intent)
+_VALID_INTENTS = frozenset({"text2sql", "out_of_scope"})
+
+# Các nhóm lỗi SQL có thể sửa bằng sql_correction
+_RETRIABLE_SQL_ERROR_CATEGORIES = frozenset({
+    "table_or_column_not_found",
+    "syntax_error",
+    "type_mismatch",
+})
+
+# Tên bảng/cột không tồn tại trong error message (PostgreSQL / MySQL)
+_MISSING_IDENTIFIER_RE = re.compile(
+    r"""(relation|table|column)\s+["'`]?([\w.]+)["'`]?\s+(?:does not exist|doesn't exist)"""
+    r"""|unknown (table|column) ["'`]?([\w.]+)["'`]?""",
+    re.IGNORECASE,
+)
+# Tên cột trong CREATE TABLE statements (mỗi cột một dòng, bắt đầu bằng "tên_cột")
+_CREATE_TABLE_COLUMN_RE = re.compile(r'^\s*"([^"]+)"\s', re.MULTILINE)
+# Độ giống tối thiểu (difflib) để tự sửa tên bảng/cột mà không cần gọi LLM
+QUICK_FIX_SIMILARITY = 0.75
+
 
 class GraphState(TypedDict):
     """State cho Graph."""
@@ -46,9 +155,11 @@ class GraphState(TypedDict):
     suggested_actions: List[str]
     token_usage: Dict[str, Any]
     retrieved_docs: List[Document]  # Kết quả truy vấn từ data retriever
-    sql_plan: str  # SQL reasoning plan từ node plan_sql
-    sql_query: str  # SQL query được sinh ra từ node generate_sql
-    sql_reason: str  # Lý do tại sao viết SQL như vậy từ node generate_sql
+    table_schema: str  # CREATE TABLE statements của các bảng trong retrieved_docs (lấy một lần)
+    sql_cache_hit: bool  # SQL lấy từ cache ở create_query (bỏ qua bước sinh SQL)
+    sql_plan: str  # SQL reasoning plan từ node plan_and_generate_sql
+    sql_query: str  # SQL query được sinh ra từ node plan_and_generate_sql / generate_sql
+    sql_reason: str  # Lý do tại sao viết SQL như vậy
     corrected_sql: str  # SQL đã được node sql_correction sửa (nếu có)
     sql_correction_reason: str  # Giải thích cách sửa SQL
     has_retried: bool  # Đã retry thực thi SQL hay chưa
@@ -62,7 +173,7 @@ class Graph:
     """Graph chung cho xử lý intent và truy vấn dữ liệu.
 
     Luồng:
-        classify_intent -> (text2sql) -> create_query -> plan_sql -> generate_sql -> execute_sql -> (format_response | sql_correction -> execute_sql) -> format_response -> END
+        classify_intent -> (text2sql) -> create_query -> (plan_and_generate_sql | generate_sql) -> execute_sql -> (format_response | sql_correction -> execute_sql) -> format_response -> END
         classify_intent -> (out_of_scope) -> handle_out_of_scope -> format_response -> END
     
     SQL Correction Flow:
@@ -77,6 +188,13 @@ class Graph:
         - handle_out_of_scope sẽ retrieve từ knowledge base (nếu có kb_retriever)
         - Generate response từ retrieved context và user query
         - Đi đến format_response để trả về cho user
+
+    plan_and_generate_sql lập kế hoạch và sinh SQL trong một lần gọi LLM (structured output).
+    Câu hỏi đơn giản (ngắn, không có từ khoá join/group by/so sánh...) không cần kế hoạch,
+    đi từ create_query đến generate_sql.
+
+    Câu hỏi đã có SQL chạy thành công trên cùng schema (sql_cache) đi thẳng từ
+    create_query đến execute_sql.
     """
 
     def __init__(
@@ -84,13 +202,27 @@ class Graph:
         data_retriever: Optional[DataRetriever] = None,
         kb_retriever: Optional[KnowledgeBaseRetriever] = None,
     ) -> None:
-        self.llm = ChatOpenAI(
-            model_name="gpt-4o-mini",
-            temperature=0.7,
-            openai_api_key=settings.openai_api_key,
-        )
+        # Phân loại intent / lập kế hoạch / sinh và sửa SQL cần kết quả ổn định (T=0),
+        # chỉ câu trả lời out_of_scope mới cần đa dạng hơn
+        self.llm_deterministic = get_chat_model(temperature=0)
+        self.llm_creative = get_chat_model(temperature=0.7)
         self.data_retriever = data_retriever
         self.kb_retriever = kb_retriever
+        self.intent_cache = SemanticIntentCache(threshold=INTENT_CACHE_SIMILARITY)
+        self.intent_embeddings = get_embedding_client(INTENT_CACHE_EMBEDDING_MODEL)
+        self.llm_cache = LLMCache()
+        self.sql_cache = TTLCache(maxsize=SQL_CACHE_MAX_SIZE, ttl=SQL_CACHE_TTL)
+        # Runnable structured output đã bind sẵn theo (llm, schema), tránh convert JSON schema mỗi lần gọi
+        self._structured_llms: Dict[Tuple[int, Type], Any] = {}
+        # Tắt batching (deployment ít người dùng đồng thời) thì phân loại từng query ngay
+        self.intent_batcher: Optional[IntentBatcher] = None
+        if settings.intent_batching_enabled:
+            self.intent_batcher = IntentBatcher(
+                self._classify_one,
+                self._classify_many,
+                max_batch_size=settings.intent_batch_max_size,
+                max_wait=settings.intent_batch_max_wait_ms / 1000,
+            )
         self.graph = self._build_graph()
 
     def _build_graph(self):
@@ -98,7 +230,7 @@ class Graph:
 
         workflow.add_node("classify_intent", self._classify_intent)
         workflow.add_node("create_query", self._create_query)
-        workflow.add_node("plan_sql", self._plan_sql)
+        workflow.add_node("plan_and_generate_sql", self._plan_and_generate_sql)
         workflow.add_node("generate_sql", self._generate_sql)
         workflow.add_node("execute_sql", self._execute_sql)
         workflow.add_node("sql_correction", self._sql_correction)
@@ -120,9 +252,17 @@ class Graph:
         # Flow cho out_of_scope: handle_out_of_scope -> format_response -> END
         workflow.add_edge("handle_out_of_scope", "format_response")
         
-        # Flow cho text2sql: create_query -> plan_sql -> generate_sql -> execute_sql -> (format_response | sql_correction) -> END
-        workflow.add_edge("create_query", "plan_sql")
-        workflow.add_edge("plan_sql", "generate_sql")
+        # Flow cho text2sql: create_query -> (plan_and_generate_sql | generate_sql) -> execute_sql -> (format_response | sql_correction) -> END
+        workflow.add_conditional_edges(
+            "create_query",
+            self._route_after_create_query,
+            {
+                "plan_and_generate_sql": "plan_and_generate_sql",
+                "generate_sql": "generate_sql",
+                "execute_sql": "execute_sql",
+            }
+        )
+        workflow.add_edge("plan_and_generate_sql", "execute_sql")
         workflow.add_edge("generate_sql", "execute_sql")
         
         # Conditional edge: nếu SQL fail và có thể retry -> sql_correction, ngược lại -> format_response
@@ -146,33 +286,51 @@ class Graph:
     def _route_after_intent(self, state: GraphState) -> str:
         """Routing sau khi phân loại intent."""
         intent = state.get("intent", "out_of_scope")
-        return intent if intent in ["text2sql", "out_of_scope"] else "out_of_scope"
+        return intent if intent in _VALID_INTENTS else "out_of_scope"
+    
+    def _is_simple_query(self, query: str) -> bool:
+        """Câu hỏi đủ đơn giản để sinh SQL trực tiếp, không cần lập kế hoạch."""
+        q = (query or "").strip().lower()
+        if len(q.split()) > SIMPLE_QUERY_MAX_WORDS:
+            return False
+        return not any(keyword in q for keyword in COMPLEX_QUERY_KEYWORDS)
+
+    def _route_after_create_query(self, state: GraphState) -> str:
+        """Routing sau create_query.
+
+        Returns:
+            "execute_sql" nếu đã có SQL trong sql_cache
+            "generate_sql" nếu create_query đã đánh dấu câu hỏi đơn giản
+            "plan_and_generate_sql" cho các trường hợp còn lại
+        """
+        if state.get("sql_cache_hit"):
+            return "execute_sql"
+        if state.get("sql_plan") == SQL_PLAN_SKIPPED:
+            return "generate_sql"
+        return "plan_and_generate_sql"
+    
+    @staticmethod
+    def _sql_cache_key(query: str, table_schema: str) -> str:
+        """Key của sql_cache: fingerprint của schema + câu hỏi đã chuẩn hoá.
+
+        Schema thay đổi (hoặc retrieve ra tập bảng khác) thì fingerprint đổi theo,
+        entry cũ tự hết hiệu lực.
+        """
+        fingerprint = hashlib.blake2b(table_schema.encode(), digest_size=8).hexdigest()
+        return f"{fingerprint}:{SemanticIntentCache.normalize_query(query)}"
     
     def _should_retry_sql(self, state: GraphState) -> bool:
         """Quyết định có nên retry SQL bằng cách gọi sql_correction hay không.
         
         Returns:
-            True nếu nên retry (chưa retry và lỗi thuộc nhóm retriable)
+            True nếu có lỗi, chưa retry và lỗi thuộc nhóm retriable
             False nếu không nên retry
         """
-        # Nếu đã retry rồi thì không retry nữa
-        if state.get("has_retried", False):
-            return False
-        
-        # Nếu không có lỗi thì không cần retry
-        sql_error = state.get("sql_error")
-        if not sql_error:
-            return False
-        
-        # Chỉ retry với các lỗi có thể sửa được (logic/syntax errors)
-        category = state.get("sql_error_category", "")
-        retriable_categories = [
-            "table_or_column_not_found",
-            "syntax_error",
-            "type_mismatch",
-        ]
-        
-        return category in retriable_categories
+        return (
+            bool(state.get("sql_error"))
+            and not state.get("has_retried", False)
+            and state.get("sql_error_category") in _RETRIABLE_SQL_ERROR_CATEGORIES
+        )
     
     def _route_after_execute_sql(self, state: GraphState) -> str:
         """Routing sau khi thực thi SQL.
@@ -181,14 +339,15 @@ class Graph:
             "format_response" nếu success hoặc không nên retry
             "sql_correction" nếu fail và nên retry
         """
-        sql_error = state.get("sql_error")
-        
         # Nếu không có lỗi, đi thẳng đến format_response
-        if not sql_error:
+        if not state.get("sql_error"):
             return "format_response"
         
-        # Nếu có lỗi và nên retry, đi đến sql_correction
-        if self._should_retry_sql(state):
+        # Có lỗi, chưa retry và lỗi có thể sửa được (logic/syntax errors) -> sql_correction
+        if (
+            not state.get("has_retried", False)
+            and state.get("sql_error_category") in _RETRIABLE_SQL_ERROR_CATEGORIES
+        ):
             logger.info("Routing to sql_correction for retry")
             return "sql_correction"
         
@@ -207,93 +366,145 @@ class Graph:
                 schema_doc_id = md.get("schema_doc_id")
 
             table_name = md.get("table_name")
+            if not table_name:
+                continue
             table_schema = md.get("table_schema") or "public"
-            if table_name:
-                full_name = (
-                    f"{table_schema}.{table_name}"
-                    if table_schema and table_schema != "public"
-                    else table_name
-                )
-                tables.append(full_name)
+            tables.append(
+                f"{table_schema}.{table_name}" if table_schema != "public" else table_name
+            )
 
         # Loại bỏ trùng lặp, giữ thứ tự
-        seen = set()
-        unique_tables = []
-        for t in tables:
-            if t not in seen:
-                seen.add(t)
-                unique_tables.append(t)
-
-        return {"schema_doc_id": schema_doc_id, "tables": unique_tables}
+        return {"schema_doc_id": schema_doc_id, "tables": list(dict.fromkeys(tables))}
 
     def _categorize_sql_error(self, error_message: str) -> str:
         """Phân loại lỗi SQL phổ biến để log/quan sát."""
-        msg = (error_message or "").lower()
-
-        table_column_patterns = [
-            "does not exist",
-            "unknown table",
-            "unknown column",
-            "undefined table",
-            "undefined column",
-            "no such table",
-            "no such column",
-        ]
-        syntax_patterns = [
-            "syntax error",
-            "parse error",
-            "at or near",
-            "sqlstate 42601",
-        ]
-        type_patterns = [
-            "type mismatch",
-            "cannot cast",
-            "invalid input syntax",
-            "data type mismatch",
-            "sqlstate 42804",
-        ]
-        permission_patterns = [
-            "permission denied",
-            "access denied",
-            "sqlstate 42501",
-            "role",
-            "not authorized",
-            "connection refused",
-            "could not connect",
-            "timeout",
-        ]
-
-        if any(p in msg for p in table_column_patterns):
-            return "table_or_column_not_found"
-        if any(p in msg for p in syntax_patterns):
-            return "syntax_error"
-        if any(p in msg for p in type_patterns):
-            return "type_mismatch"
-        if any(p in msg for p in permission_patterns):
-            return "permission_or_connection"
+        msg = error_message or ""
+        for category, pattern in _SQL_ERROR_CATEGORY_PATTERNS:
+            if pattern.search(msg):
+                return category
         return "other"
 
     
 
+    def _get_structured_llm(self, llm: ChatOpenAI, schema: Type) -> Any:
+        """`llm.with_structured_output(schema)`, chỉ tạo một lần cho mỗi cặp (llm, schema)."""
+        key = (id(llm), schema)
+        runnable = self._structured_llms.get(key)
+        if runnable is None:
+            runnable = llm.with_structured_output(schema)
+            self._structured_llms[key] = runnable
+        return runnable
+
+    async def _ainvoke_llm(
+        self,
+        llm: ChatOpenAI,
+        lc_messages: List[Any],
+        schema: Optional[Type] = None,
+        cache: bool = False,
+        prompt_cache_key: Optional[str] = None,
+    ) -> Any:
+        """Gọi LLM (structured output nếu có schema), dùng lại response đã cache nếu được.
+
+        Chỉ cache khi temperature=0 (response gần như cố định) hoặc khi caller chủ động
+        bật cache (ví dụ phân loại intent). `prompt_cache_key` được gửi kèm request
+        (extra_body) để OpenAI dùng lại prompt cache của system prompt.
+        """
+        cacheable = cache or llm.temperature == 0
+        key = None
+        if cacheable:
+            key = LLMCache.make_key(llm.model_name, llm.temperature, lc_messages, schema)
+            response = self.llm_cache.get(key)
+            if response is not None:
+                logger.debug("LLM cache hit")
+                return response
+
+        runnable = self._get_structured_llm(llm, schema) if schema is not None else llm
+        if prompt_cache_key:
+            response = await runnable.ainvoke(
+                lc_messages, extra_body={"prompt_cache_key": prompt_cache_key}
+            )
+        else:
+            response = await runnable.ainvoke(lc_messages)
+        # Token usage có sẵn trong response_metadata (chỉ với response dạng message)
+        usage = (getattr(response, "response_metadata", None) or {}).get("token_usage")
+        if usage:
+            logger.debug("LLM token usage: %s", usage)
+
+        if cacheable:
+            self.llm_cache.set(key, response)
+        return response
+
+    async def _classify_one(self, query: str) -> str:
+        """Phân loại intent cho một query (một lần gọi LLM)."""
+        lc_messages = [
+            _SYS_INTENT,
+            HumanMessage(content=f"Câu hỏi: {query}"),
+        ]
+        response = await self._ainvoke_llm(
+            self.llm_deterministic,
+            lc_messages,
+            IntentClassifierSchema,
+            cache=True,
+            prompt_cache_key=PROMPT_CACHE_KEY_INTENT,
+        )
+        return response.intent
+
+    async def _classify_many(self, queries: List[str]) -> List[str]:
+        """Phân loại intent cho nhiều query trong một lần gọi LLM, giữ đúng thứ tự.
+
+        Mỗi query được encode thành chuỗi JSON (escape xuống dòng, dấu nháy) để câu hỏi
+        của một người dùng không thể giả làm câu hỏi/chỉ dẫn khác trong cùng prompt.
+        """
+        numbered_queries = "\n".join(
+            f"{i}. {json.dumps(query, ensure_ascii=False)}"
+            for i, query in enumerate(queries, start=1)
+        )
+        lc_messages = [
+            _SYS_INTENT,
+            HumanMessage(
+                content=INTENT_BATCH_USER_PROMPT.format(
+                    numbered_queries=numbered_queries,
+                    count=len(queries),
+                )
+            ),
+        ]
+        response = await self._ainvoke_llm(
+            self.llm_deterministic,
+            lc_messages,
+            IntentBatchSchema,
+            prompt_cache_key=PROMPT_CACHE_KEY_INTENT,
+        )
+        return [item.intent for item in response.intents]
+
     async def _classify_intent(self, state: GraphState) -> Dict[str, Any]:
         """Phân loại intent từ query của người dùng."""
         try:
             query = state.get("query", "")
 
-            lc_messages = [
-                SystemMessage(content=INTENT_CLASSIFICATION_PROMPT),
-                HumanMessage(content=f"Câu hỏi: {query}"),
-            ]
-
-            with get_openai_callback() as cb:
-                llm_with_structured = self.llm.with_structured_output(
-                    IntentClassifierSchema
-                )
-                response = await llm_with_structured.ainvoke(lc_messages)
-                intent = response.intent
-
-                logger.info(f"Classified intent: {intent} for query: {query[:50]}...")
+            # Dùng lại intent đã phân loại cho cùng query hoặc query gần giống
+            intent = self.intent_cache.get_exact(query)
+            if intent is not None:
+                logger.info("Intent cache hit (exact): %s for query: %.50s...", intent, query)
+                return {"intent": intent}
+
+            query_vector = None
+            try:
+                query_vector = await self.intent_embeddings.aembed_query(query)
+                intent = self.intent_cache.lookup(query_vector)
+            except Exception as e:
+                logger.warning(f"Intent cache lookup failed: {e}")
+            if intent is not None:
+                logger.info("Intent cache hit (semantic): %s for query: %.50s...", intent, query)
+                return {"intent": intent}
+
+            # Gom với các query đến cùng lúc thành một lần gọi LLM
+            if self.intent_batcher is not None:
+                intent = await self.intent_batcher.submit(query)
+            else:
+                intent = await self._classify_one(query)
+            logger.info("Classified intent: %s for query: %.50s...", intent, query)
 
+            self.intent_cache.add(query, query_vector, intent)
             return {"intent": intent}
         except Exception as e:
             logger.error(f"Error in Graph classify_intent: {e}")
@@ -306,76 +517,102 @@ class Graph:
             
             if not self.data_retriever:
                 logger.warning("Data retriever is not initialized, skipping data retrieval")
-                return {"retrieved_docs": []}
+                return {"retrieved_docs": [], "table_schema": ""}
             
             retriever = self.data_retriever.get_data_retriever()
             if retriever is None:
                 logger.warning("Data retriever is None, cannot retrieve documents")
-                return {"retrieved_docs": []}
+                return {"retrieved_docs": [], "table_schema": ""}
             
             # Truy vấn documents liên quan đến query
             retrieved_docs = await retriever.ainvoke(query)
             
             logger.info(
-                f"Retrieved {len(retrieved_docs)} documents for query: {query[:50]}..."
+                "Retrieved %d documents for query: %.50s...", len(retrieved_docs), query
             )
             
-            return {"retrieved_docs": retrieved_docs}
+            # Lấy CREATE TABLE statements từ MongoDB một lần, dùng chung cho plan/generate/correction
+            table_schema = ""
+            if retrieved_docs:
+                table_schema = await get_table_schemas_from_retrieved_docs(retrieved_docs)
+            
+            result = {"retrieved_docs": retrieved_docs, "table_schema": table_schema or ""}
+            
+            # Đã có SQL chạy thành công cho cùng câu hỏi trên cùng schema: bỏ qua plan/generate
+            cached = self.sql_cache.get(self._sql_cache_key(query, table_schema)) if table_schema else None
+            if cached is not None:
+                logger.info("SQL cache hit for query: %.50s...", query)
+                result.update(
+                    cached,
+                    sql_cache_hit=True,
+                    corrected_sql="",
+                    sql_correction_reason="",
+                    has_retried=False,
+                )
+            elif table_schema and self._is_simple_query(query):
+                logger.info("Skipping SQL planning for simple query: %.50s...", query)
+                result["sql_plan"] = SQL_PLAN_SKIPPED
+            return result
         except Exception as e:
             logger.error(f"Error in Graph create_query: {e}", exc_info=True)
-            return {"retrieved_docs": []}
+            return {"retrieved_docs": [], "table_schema": ""}
     
-    async def _plan_sql(self, state: GraphState) -> Dict[str, Any]:
-        """Phân tích query và retrieved_docs để tạo SQL reasoning plan."""
+    async def _plan_and_generate_sql(self, state: GraphState) -> Dict[str, Any]:
+        """Lập kế hoạch SQL reasoning và sinh SQL query trong một lần gọi LLM."""
         try:
             query = state.get("query", "")
-            retrieved_docs = state.get("retrieved_docs", [])
-            
-            if not retrieved_docs:
-                logger.warning("No retrieved docs available for SQL planning")
-                return {"sql_plan": "Không có schema information để tạo kế hoạch SQL."}
             
-            # Lấy CREATE TABLE statements từ MongoDB dựa trên retrieved_docs
-            retrieved_schema = await get_table_schemas_from_retrieved_docs(retrieved_docs)
+            # CREATE TABLE statements đã lấy ở node create_query
+            table_schema = state.get("table_schema", "")
             
-            if not retrieved_schema:
+            if not table_schema:
                 logger.warning("Could not retrieve table schemas from MongoDB")
-                return {"sql_plan": "Không thể lấy schema information từ database."}
+                return {"sql_query": ""}
             
-            # Gọi LLM để tạo SQL plan
+            # Gọi LLM để lập kế hoạch và sinh SQL với structured output
             lc_messages = [
-                SystemMessage(content=SQL_PLANNING_SYSTEM_PROMPT),
-                HumanMessage(content=SQL_PLANNING_USER_PROMPT.format(
-                    user_query=query,
-                    retrieved_schema=retrieved_schema
+                _SYS_PLAN_AND_GEN,
+                SystemMessage(content=SQL_GENERATION_SCHEMA_PROMPT.format(
+                    table_schema=table_schema
                 )),
+                HumanMessage(content=SQL_PLAN_AND_GENERATION_USER_PROMPT.format(user_query=query)),
             ]
             
-            with get_openai_callback() as cb:
-                response = await self.llm.ainvoke(lc_messages)
-                sql_plan = response.content
-                
-                logger.info(f"Generated SQL plan for query: {query[:50]}...")
-                logger.debug(f"SQL Plan: {sql_plan[:200]}...")
+            response = await self._ainvoke_llm(
+                self.llm_deterministic,
+                lc_messages,
+                SQLPlanAndGenerationSchema,
+                prompt_cache_key=PROMPT_CACHE_KEY_SQL_PLAN_AND_GEN,
+            )
+            
+            logger.info("Generated SQL plan and query for query: %.50s...", query)
+            logger.debug("SQL Plan: %.200s...", response.plan)
             
-            return {"sql_plan": sql_plan}
+            # Khi generate xong SQL lần đầu, reset các field liên quan đến correction
+            return {
+                "sql_plan": response.plan,
+                "sql_query": response.sql.strip(),
+                "sql_reason": response.reason,
+                "corrected_sql": "",
+                "sql_correction_reason": "",
+                "has_retried": False,
+            }
         except Exception as e:
-            logger.error(f"Error in Graph plan_sql: {e}", exc_info=True)
-            return {"sql_plan": f"Lỗi khi tạo SQL plan: {str(e)}"}
+            logger.error(f"Error in Graph plan_and_generate_sql: {e}", exc_info=True)
+            return {"sql_query": ""}
     
     async def _generate_sql(self, state: GraphState) -> Dict[str, Any]:
-        """Sinh SQL query từ plan và schema."""
+        """Sinh SQL query từ plan và schema (câu hỏi đơn giản: plan là SQL_PLAN_SKIPPED)."""
         try:
             query = state.get("query", "")
             sql_plan = state.get("sql_plan", "")
-            retrieved_docs = state.get("retrieved_docs", [])
             
             if not sql_plan:
                 logger.warning("No SQL plan available for SQL generation")
                 return {"sql_query": ""}
             
-            # Lấy CREATE TABLE statements từ MongoDB dựa trên retrieved_docs
-            table_schema = await get_table_schemas_from_retrieved_docs(retrieved_docs)
+            # CREATE TABLE statements đã lấy ở node create_query
+            table_schema = state.get("table_schema", "")
             
             if not table_schema:
                 logger.warning("Could not retrieve table schemas from MongoDB")
@@ -383,24 +620,27 @@ class Graph:
             
             # Gọi LLM để sinh SQL với structured output
             lc_messages = [
-                SystemMessage(content=SQL_GENERATION_SYSTEM_PROMPT),
+                _SYS_GEN,
+                SystemMessage(content=SQL_GENERATION_SCHEMA_PROMPT.format(
+                    table_schema=table_schema
+                )),
                 HumanMessage(content=SQL_GENERATION_USER_PROMPT.format(
                     user_query=query,
                     sql_plan=sql_plan,
-                    table_schema=table_schema
                 )),
             ]
             
-            with get_openai_callback() as cb:
-                llm_with_structured = self.llm.with_structured_output(
-                    SQLGenerationSchema
-                )
-                response = await llm_with_structured.ainvoke(lc_messages)
-                sql_query = response.sql.strip()
-                sql_reason = response.reason
-                
-                # logger.info(f"Generated SQL query: {sql_query[:100]}...")
-                # logger.debug(f"SQL generation reason: {sql_reason[:200]}...")
+            response = await self._ainvoke_llm(
+                self.llm_deterministic,
+                lc_messages,
+                SQLGenerationSchema,
+                prompt_cache_key=PROMPT_CACHE_KEY_SQL_GEN,
+            )
+            sql_query = response.sql.strip()
+            sql_reason = response.reason
+            
+            # logger.info(f"Generated SQL query: {sql_query[:100]}...")
+            # logger.debug(f"SQL generation reason: {sql_reason[:200]}...")
             
             # Khi generate xong SQL lần đầu, reset các field liên quan đến correction
             return {
@@ -424,7 +664,6 @@ class Graph:
 
             sql_query = state.get("sql_query", "")
             sql_error = state.get("sql_error", "") or ""
-            retrieved_docs = state.get("retrieved_docs", [])
 
             if not sql_query or not sql_error:
                 logger.warning(
@@ -432,16 +671,26 @@ class Graph:
                 )
                 return {}
 
-            # Lấy CREATE TABLE statements từ MongoDB để hỗ trợ sửa lỗi chính xác
-            table_schema = await get_table_schemas_from_retrieved_docs(retrieved_docs)
+            # CREATE TABLE statements (đã lấy ở node create_query) để hỗ trợ sửa lỗi chính xác
+            table_schema = state.get("table_schema", "")
             if not table_schema:
                 logger.warning(
                     "SQL correction: could not retrieve table schemas from MongoDB"
                 )
                 return {}
 
+            # Lỗi sai tên bảng/cột: thử sửa bằng tên gần giống trong schema trước khi gọi LLM
+            if state.get("sql_error_category") == "table_or_column_not_found":
+                corrected_sql = self._quick_fix_sql(sql_query, sql_error, state)
+                if corrected_sql:
+                    return {
+                        "corrected_sql": corrected_sql,
+                        "sql_correction_reason": "Sửa tên bảng/cột theo tên gần giống nhất trong schema.",
+                        "has_retried": True,
+                    }
+
             lc_messages = [
-                SystemMessage(content=SQL_CORRECTION_SYSTEM_PROMPT),
+                _SYS_CORR,
                 HumanMessage(
                     content=SQL_CORRECTION_USER_PROMPT.format(
                         table_schema=table_schema,
@@ -451,13 +700,14 @@ class Graph:
                 ),
             ]
 
-            with get_openai_callback() as cb:
-                llm_with_structured = self.llm.with_structured_output(
-                    SQLCorrectionSchema
-                )
-                response = await llm_with_structured.ainvoke(lc_messages)
-                corrected_sql = response.sql.strip()
-                correction_reason = response.reason
+            response = await self._ainvoke_llm(
+                self.llm_deterministic,
+                lc_messages,
+                SQLCorrectionSchema,
+                prompt_cache_key=PROMPT_CACHE_KEY_SQL_CORR,
+            )
+            corrected_sql = response.sql.strip()
+            correction_reason = response.reason
 
             logger.info(
                 "SQL correction generated successfully",
@@ -476,6 +726,63 @@ class Graph:
             logger.error(f"Error in Graph sql_correction: {e}", exc_info=True)
             # Nếu correction lỗi, không thay đổi state, để flow chính xử lý error như cũ
             return {}
+
+    def _quick_fix_sql(self, sql_query: str, sql_error: str, state: GraphState) -> Optional[str]:
+        """Sửa nhanh lỗi sai tên bảng/cột bằng tên gần giống nhất trong schema (không gọi LLM).
+
+        Args:
+            sql_query: SQL bị lỗi
+            sql_error: Error message khi thực thi
+            state: State hiện tại (lấy retrieved_docs và table_schema)
+
+        Returns:
+            SQL đã sửa, hoặc None nếu không sửa được bằng cách này
+        """
+        match = _MISSING_IDENTIFIER_RE.search(sql_error)
+        if not match:
+            return None
+        kind = (match.group(1) or match.group(3)).lower()
+        identifier = match.group(2) or match.group(4)
+
+        if kind == "column":
+            # Bỏ tên bảng/alias phía trước (s.name -> name)
+            identifier = identifier.rsplit(".", 1)[-1]
+            candidates = _CREATE_TABLE_COLUMN_RE.findall(state.get("table_schema", ""))
+        else:
+            candidates = self._extract_schema_context(state.get("retrieved_docs", []))["tables"]
+            # MySQL báo lỗi kèm tên database (db.table)
+            if "." in identifier and not any("." in c for c in candidates):
+                identifier = identifier.rsplit(".", 1)[-1]
+
+        by_lower = {c.lower(): c for c in candidates}
+        close = difflib.get_close_matches(
+            identifier.lower(), list(by_lower), n=1, cutoff=QUICK_FIX_SIMILARITY
+        )
+        if not close or by_lower[close[0]] == identifier:
+            return None
+        replacement = by_lower[close[0]]
+
+        # PostgreSQL: tên có chữ hoa phải đặt trong dấu nháy kép
+        sql_connector = get_sql_connector()
+        needs_quote = (
+            sql_connector is not None
+            and sql_connector.db_type == "postgres"
+            and replacement != replacement.lower()
+        )
+
+        def _replace(m: "re.Match[str]") -> str:
+            quote = m.group(1)
+            if quote or not needs_quote:
+                return f"{quote}{replacement}{quote}"
+            return ".".join(f'"{part}"' for part in replacement.split("."))
+
+        pattern = re.compile(rf'(?<!\w)(["`]?){re.escape(identifier)}\1(?!\w)')
+        fixed_sql = pattern.sub(_replace, sql_query)
+        if fixed_sql == sql_query:
+            return None
+
+        logger.info("Quick SQL fix: %r -> %r", identifier, replacement)
+        return fixed_sql
     
     async def _execute_sql(self, state: GraphState) -> Dict[str, Any]:
         """Thực thi SQL query và lấy kết quả.
@@ -519,8 +826,10 @@ class Graph:
                     extra={"sql_preview": sql_to_execute[:100]},
                 )
             
-            # Thực thi SQL
-            success, result, error = sql_connector.execute_query_safe(sql_to_execute)
+            # Thực thi SQL trong thread pool (driver đồng bộ) để không chặn event loop
+            success, result, error = await asyncio.to_thread(
+                sql_connector.execute_query_safe, sql_to_execute
+            )
             
             if success:
                 logger.info(
@@ -532,8 +841,24 @@ class Graph:
                         # "tables": schema_ctx.get("tables"),
                     },
                 )
+                # Lưu SQL đã chạy được (kể cả SQL đã sửa) để dùng lại cho cùng câu hỏi
+                table_schema = state.get("table_schema", "")
+                if table_schema and not state.get("sql_cache_hit"):
+                    self.sql_cache.set(
+                        self._sql_cache_key(state.get("query", ""), table_schema),
+                        {
+                            "sql_plan": state.get("sql_plan", ""),
+                            "sql_query": sql_to_execute,
+                            "sql_reason": sql_reason,
+                        },
+                    )
                 return {"sql_result": result, "sql_error": None}
             else:
+                # SQL lấy từ cache không còn chạy được: bỏ entry, lần sau sinh lại
+                if state.get("sql_cache_hit"):
+                    self.sql_cache.pop(
+                        self._sql_cache_key(state.get("query", ""), state.get("table_schema", ""))
+                    )
                 category = self._categorize_sql_error(error)
                 logger.error(
                     "SQL execution failed",
@@ -563,25 +888,36 @@ class Graph:
             elif sql_result is None:
                 final_response = "Không thể lấy kết quả từ database."
             else:
+                # execute_query trả về {"columns", "rows"}: chỉ format phần rows,
+                # không str() toàn bộ kết quả (rows đầy đủ vẫn giữ trong sql_result cho frontend)
+                if isinstance(sql_result, dict) and "rows" in sql_result:
+                    sql_result = sql_result["rows"]
+                
                 # Format kết quả
                 if isinstance(sql_result, str):
                     # Nếu là string, có thể đã được format sẵn
                     final_response = sql_result
-                elif isinstance(sql_result, (list, tuple)):
-                    # Nếu là list/tuple, format thành bảng
-                    if not sql_result:
+                elif isinstance(sql_result, (list, tuple)) or hasattr(sql_result, "__next__"):
+                    # Nếu là list/tuple (hoặc iterator), format thành bảng, chỉ lấy FORMAT_MAX_ROWS + 1 dòng
+                    head = list(islice(sql_result, FORMAT_MAX_ROWS + 1))
+                    if not head:
                         final_response = "Không tìm thấy kết quả nào."
                     else:
                         # Format đơn giản
-                        result_str = "\n".join([str(row) for row in sql_result[:50]])  # Limit 50 rows
-                        if len(sql_result) > 50:
-                            result_str += f"\n... (còn {len(sql_result) - 50} kết quả khác)"
+                        result_str = "\n".join(map(str, head[:FORMAT_MAX_ROWS]))
+                        if hasattr(sql_result, "__len__"):
+                            extra = len(sql_result) - FORMAT_MAX_ROWS
+                        else:
+                            extra = len(head) - FORMAT_MAX_ROWS
+                        if extra > 0:
+                            more = "" if hasattr(sql_result, "__len__") else "ít nhất "
+                            result_str += f"\n... (còn {more}{extra} kết quả khác)"
                         final_response = f"Kết quả:\n{result_str}"
                 else:
                     # Fallback: convert to string
                     final_response = str(sql_result)
             
-            logger.info(f"Formatted response for query: {query[:50]}...")
+            logger.info("Formatted response for query: %.50s...", query)
             
             return {"final_response": final_response}
         except Exception as e:
@@ -611,8 +947,9 @@ class Graph:
                                 context_parts.append(doc.page_content)
                             retrieved_context = "\n\n---\n\n".join(context_parts)
                             logger.info(
-                                f"Retrieved {len(retrieved_docs)} documents from knowledge base "
-                                f"for query: {query[:50]}..."
+                                "Retrieved %d documents from knowledge base for query: %.50s...",
+                                len(retrieved_docs),
+                                query,
                             )
                         else:
                             logger.info("No relevant documents found in knowledge base")
@@ -630,18 +967,19 @@ class Graph:
             
             # Gọi LLM để generate response
             lc_messages = [
-                SystemMessage(content=OUT_OF_SCOPE_SYSTEM_PROMPT),
+                _SYS_OOS,
                 HumanMessage(content=OUT_OF_SCOPE_USER_PROMPT.format(
                     user_query=query,
                     retrieved_context=retrieved_context,
                 )),
             ]
             
-            with get_openai_callback() as cb:
-                response = await self.llm.ainvoke(lc_messages)
-                final_response = response.content.strip()
-                
-                logger.info(f"Generated out_of_scope response for query: {query[:50]}...")
+            response = await self._ainvoke_llm(
+                self.llm_creative, lc_messages, prompt_cache_key=PROMPT_CACHE_KEY_OUT_OF_SCOPE
+            )
+            final_response = response.content.strip()
+            
+            logger.info("Generated out_of_scope response for query: %.50s...", query)
             
             return {"final_response": final_response}
         except Exception as e:
@@ -649,5 +987,12 @@ class Graph:
             return {"final_response": f"Xin lỗi, đã xảy ra lỗi khi xử lý câu hỏi của bạn: {str(e)}"}
 
 
-graph = Graph()
+
+@lru_cache(maxsize=1)
+def get_graph() -> Graph:
+    """Graph dùng chung, khởi tạo ở lần gọi đầu tiên (không tạo OpenAI client lúc import).
+
+    Test có thể reset bằng `get_graph.cache_clear()`.
+    """
+    return Graph()
 
@@ -0,0 +1,150 @@
+"""
+Gom các request phân loại intent đến gần nhau thành một lần gọi LLM.
+
+Khi nhiều người dùng hỏi cùng lúc, mỗi query vốn tốn một request OpenAI dù system
+prompt giống hệt nhau. Batcher giữ query trong một cửa sổ ngắn (mặc định 200 ms
+hoặc đủ 8 query) rồi phân loại cả nhóm bằng một prompt đánh số. Khi không có query
+nào khác đang chờ hoặc đang xử lý, query được phân loại ngay (không chờ cửa sổ).
+
+Lưu ý: prompt batch đặt câu hỏi của nhiều người dùng vào cùng một context, nên một
+câu hỏi cố tình chèn chỉ dẫn (prompt injection) có thể ảnh hưởng intent của câu hỏi
+khác trong batch. Caller phải escape/phân tách từng câu hỏi (xem Graph._classify_many).
+"""
+import asyncio
+import contextvars
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Số query tối đa trong một batch
+INTENT_BATCH_MAX_SIZE = 8
+# Thời gian tối đa (giây) chờ gom thêm query sau query đầu tiên của batch
+INTENT_BATCH_MAX_WAIT = 0.2
+
+# Kết quả worker trả cho submitter khi query cần được phân loại đơn lẻ (batch chỉ có
+# một query, hoặc batch lỗi): submitter tự gọi classify_one trong context của mình
+_CLASSIFY_INLINE = object()
+
+ClassifyOne = Callable[[str], Awaitable[str]]
+ClassifyMany = Callable[[List[str]], Awaitable[List[str]]]
+
+
+class IntentBatcher:
+    """
+    Micro-batcher cho phân loại intent.
+
+    `submit(query)` phân loại ngay bằng `classify_one` nếu batcher đang rảnh; nếu không,
+    đưa query vào queue và chờ kết quả: một background task (khởi động ở lần cần đầu
+    tiên) gom tối đa `max_batch_size` query hoặc chờ tối đa `max_wait` giây, rồi gọi
+    `classify_many`. Batch chỉ có một query, hoặc batch
+    trả về sai số lượng / lỗi parse, sẽ dùng `classify_one` cho từng query.
+
+    `classify_one` luôn chạy trong context của submitter (callbacks/config của request,
+    ví dụ OpenAICallbackHandler đếm token). Riêng lần gọi `classify_many` chạy trong
+    worker với context rỗng (phục vụ nhiều request), nên token của batch nhiều query
+    không được tính vào token_usage của request nào.
+
+    Không thread-safe; dùng trong một event loop của asyncio.
+    """
+
+    def __init__(
+        self,
+        classify_one: ClassifyOne,
+        classify_many: ClassifyMany,
+        max_batch_size: int = INTENT_BATCH_MAX_SIZE,
+        max_wait: float = INTENT_BATCH_MAX_WAIT,
+    ):
+        self.classify_one = classify_one
+        self.classify_many = classify_many
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._inflight: Set[asyncio.Task] = set()
+        self._busy = 0  # Số query đang được phân loại (trực tiếp hoặc qua queue)
+
+    def _ensure_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        # Queue/Task gắn với event loop; tạo lại nếu loop thay đổi (ví dụ reload, test)
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = None
+        if self._worker is None or self._worker.done():
+            # Context rỗng: worker phục vụ mọi request, không giữ callbacks/config
+            # của request đã khởi động nó
+            self._worker = loop.create_task(self._run(), context=contextvars.Context())
+
+    async def submit(self, query: str) -> str:
+        """Đưa query vào batch kế tiếp và chờ intent của nó.
+
+        Args:
+            query: Câu hỏi của người dùng
+
+        Returns:
+            Intent đã phân loại (text2sql hoặc out_of_scope)
+        """
+        if self._busy == 0:
+            # Không có query nào đang chờ/đang xử lý: phân loại ngay, không chờ gom batch
+            self._busy += 1
+            try:
+                return await self.classify_one(query)
+            finally:
+                self._busy -= 1
+
+        self._busy += 1
+        try:
+            self._ensure_worker()
+            future = self._loop.create_future()
+            self._queue.put_nowait((query, future))
+            result = await future
+            if result is _CLASSIFY_INLINE:
+                return await self.classify_one(query)
+            return result
+        finally:
+            self._busy -= 1
+
+    async def _run(self) -> None:
+        queue = self._queue
+        loop = self._loop
+        while True:
+            batch: List[Tuple[str, asyncio.Future]] = [await queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Gọi LLM trong task riêng để tiếp tục gom batch kế tiếp trong lúc chờ
+            task = loop.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        queries = [query for query, _ in batch]
+        results: List[object]
+        if len(queries) == 1:
+            # Không có gì để gom: trả lại cho submitter tự phân loại
+            results = [_CLASSIFY_INLINE]
+        else:
+            try:
+                results = await self.classify_many(queries)
+                if len(results) != len(queries):
+                    raise ValueError(
+                        f"expected {len(queries)} intents, got {len(results)}"
+                    )
+                logger.info(f"Classified {len(queries)} intents in one batch")
+            except Exception as e:
+                logger.warning(f"Batched intent classification failed, falling back to single-shot: {e}")
+                results = [_CLASSIFY_INLINE] * len(queries)
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,87 @@
+"""
+Cache kết quả phân loại intent theo độ tương đồng ngữ nghĩa của query.
+
+Intent classification lặp lại rất nhiều (cùng câu hỏi hoặc câu hỏi gần giống nhau
+giữa các session), nên dùng lại intent đã phân loại thay vì gọi LLM mỗi lần.
+"""
+import time
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from app.core.cache import TTLCache
+
+
+class SemanticIntentCache:
+    """
+    Cache intent theo query, gồm hai tầng:
+
+    - Exact match: dict query đã chuẩn hoá (lowercase, gộp khoảng trắng) -> intent (LRU + TTL).
+    - Semantic match: ma trận embeddings (đã chuẩn hoá L2) của các query đã phân loại,
+      tra cứu bằng một phép nhân ma trận và lấy argmax cosine similarity.
+
+    Ma trận là ring buffer kích thước cố định: entry cũ nhất bị ghi đè khi đầy,
+    entry quá ttl bị bỏ qua khi tra cứu nên không cần prune định kỳ.
+
+    Không thread-safe; dùng trong event loop của asyncio.
+    """
+
+    def __init__(self, threshold: float = 0.92, maxsize: int = 2048, ttl: float = 3600.0):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._exact = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._vectors: Optional[np.ndarray] = None  # (maxsize, D), cấp phát ở lần add đầu tiên
+        self._intents: List[Optional[str]] = [None] * maxsize
+        self._expires_at = np.full(maxsize, -np.inf)
+        self._next = 0
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Chuẩn hoá query làm key exact match: lowercase, bỏ khoảng trắng thừa."""
+        return " ".join(query.lower().split())
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def get_exact(self, query: str) -> Optional[str]:
+        """Intent đã cache cho đúng query này (None nếu chưa có)."""
+        return self._exact.get(self.normalize_query(query))
+
+    def lookup(self, vector: Sequence[float]) -> Optional[str]:
+        """Intent của query gần nhất nếu cosine similarity >= threshold."""
+        if self._vectors is None:
+            return None
+        valid = self._expires_at > time.monotonic()
+        if not valid.any():
+            return None
+        similarities = self._vectors @ self._normalize(vector)
+        similarities[~valid] = -np.inf
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.threshold:
+            return self._intents[best]
+        return None
+
+    def add(self, query: str, vector: Optional[Sequence[float]], intent: str) -> None:
+        """Lưu intent cho query (và embedding của query nếu có)."""
+        self._exact.set(self.normalize_query(query), intent)
+        if vector is None:
+            return
+        v = self._normalize(vector)
+        if self._vectors is None:
+            self._vectors = np.zeros((self.maxsize, v.shape[0]), dtype=np.float32)
+        slot = self._next
+        self._vectors[slot] = v
+        self._intents[slot] = intent
+        self._expires_at[slot] = time.monotonic() + self.ttl
+        self._next = (slot + 1) % self.maxsize
+
+    def clear(self) -> None:
+        self._exact.clear()
+        self._vectors = None
+        self._intents = [None] * self.maxsize
+        self._expires_at.fill(-np.inf)
+        self._next = 0
@@ -7,7 +7,7 @@ from langchain.retrievers import ContextualCompressionRetriever
 from langchain_openai import ChatOpenAI
 from langchain_core.vectorstores import VectorStore
 
-from app.core.config import settings
+from app.core.llm import get_chat_model
 from app.graph.load_knowledge_base_embeddings import create_knowledge_base_vectorstore
 import logging
 
@@ -35,11 +35,7 @@ class KnowledgeBaseRetriever:
             auto_load_embeddings: Nếu True, tự động load embeddings từ MongoDB nếu
                 kb_vectorstore là None.
         """
-        self.llm = llm or ChatOpenAI(
-            model_name="gpt-4o-mini",
-            temperature=0.7,
-            openai_api_key=settings.openai_api_key,
-        )
+        self.llm = llm or get_chat_model(temperature=0.7)
         self.source_id = source_id
         self.document_id = document_id
         
@@ -0,0 +1,53 @@
+"""
+Cache kết quả gọi LLM theo nội dung request (exact match).
+
+Cùng model + cùng messages + cùng output schema thì dùng lại response đã có,
+không gọi lại OpenAI.
+"""
+import hashlib
+from typing import Any, Optional, Sequence, Type
+
+import orjson
+from langchain_core.messages import BaseMessage
+
+from app.core.cache import TTLCache
+
+
+class LLMCache:
+    """
+    LRU + TTL cache cho response của LLM, key là BLAKE2b (16 bytes) của request.
+
+    Không thread-safe; dùng trong event loop của asyncio (không có await
+    giữa get/set) nên không cần lock.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def make_key(
+        model: str,
+        temperature: Optional[float],
+        messages: Sequence[BaseMessage],
+        schema: Optional[Type] = None,
+    ) -> str:
+        """Tạo cache key từ model, temperature, messages và output schema."""
+        payload = orjson.dumps(
+            {
+                "model": model,
+                "temperature": temperature,
+                "messages": [[message.type, message.content] for message in messages],
+                "schema": schema.__name__ if schema is not None else None,
+            },
+            option=orjson.OPT_SORT_KEYS,
+        )
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Any:
+        return self._cache.get(key)
+
+    def set(self, key: str, value: Any) -> None:
+        self._cache.set(key, value)
+
+    def clear(self) -> None:
+        self._cache.clear()
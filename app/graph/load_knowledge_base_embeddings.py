@@ -12,8 +12,8 @@ from langchain_core.embeddings import Embeddings
 from langchain_openai import OpenAIEmbeddings
 
 from app.core.database import get_database
+from app.core.embeddings import get_embedding_client
 from app.models.knowledge_base import KnowledgeBaseChunkEmbedding
-from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
@@ -133,12 +133,9 @@ async def create_knowledge_base_vectorstore(
         
         documents.append(Document(page_content=doc_text, metadata=metadata))
     
-    # Tạo embedding model nếu chưa có
+    # Dùng embedding model dùng chung nếu chưa có
     if embedding_model is None:
-        embedding_model = OpenAIEmbeddings(
-            model="text-embedding-3-large",
-            openai_api_key=settings.openai_api_key
-        )
+        embedding_model = get_embedding_client()
     
     # Tạo FAISS vectorstore từ embeddings đã có
     # Sử dụng custom Embeddings class để dùng precomputed embeddings
@@ -2,21 +2,30 @@
 Helper functions để load schema embeddings từ MongoDB và tạo vectorstore.
 """
 import logging
+import uuid
 from typing import Optional, List
 from datetime import datetime
 from bson import ObjectId
 
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
-from langchain_core.embeddings import Embeddings
 from langchain_openai import OpenAIEmbeddings
 
 from app.core.database import get_database
+from app.core.embeddings import get_embedding_client, decode_embedding_vector
 from app.models.database_schema import TableEmbedding
-from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Từ số vectors này trở lên dùng HNSW (xấp xỉ, O(log N)) thay cho brute-force IndexFlatL2
+HNSW_MIN_VECTORS = 1000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
 
 async def load_embeddings_from_mongodb(schema_doc_id: Optional[str] = None) -> List[TableEmbedding]:
     """
@@ -53,6 +62,9 @@ async def load_embeddings_from_mongodb(schema_doc_id: Optional[str] = None) -> L
         # Convert ObjectId to string
         if "_id" in doc:
             doc["_id"] = str(doc["_id"])
+        # Vector có thể lưu dạng float32 bytes
+        if "embedding_vector" in doc:
+            doc["embedding_vector"] = decode_embedding_vector(doc["embedding_vector"])
         # Convert datetime fields
         for field in ["created_at", "updated_at"]:
             if field in doc and not isinstance(doc[field], datetime):
@@ -65,6 +77,24 @@ async def load_embeddings_from_mongodb(schema_doc_id: Optional[str] = None) -> L
     return embeddings
 
 
+def _build_faiss_index(vectors: np.ndarray) -> faiss.Index:
+    """
+    Tạo FAISS index (L2) từ các vectors đã có.
+    
+    Schema nhỏ dùng IndexFlatL2 (chính xác, đủ nhanh); schema lớn dùng IndexHNSWFlat.
+    Cả hai đều hỗ trợ reconstruct() mà MMR search cần.
+    """
+    dim = vectors.shape[1]
+    if len(vectors) >= HNSW_MIN_VECTORS:
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    else:
+        index = faiss.IndexFlatL2(dim)
+    index.add(vectors)
+    return index
+
+
 async def create_vectorstore_from_embeddings(
     schema_doc_id: Optional[str] = None,
     embedding_model: Optional[OpenAIEmbeddings] = None
@@ -116,68 +146,26 @@ async def create_vectorstore_from_embeddings(
         
         documents.append(Document(page_content=doc_text, metadata=metadata))
     
-    # Tạo embedding model nếu chưa có
+    # Dùng embedding model dùng chung nếu chưa có
     if embedding_model is None:
-        embedding_model = OpenAIEmbeddings(
-            model="text-embedding-3-large",
-            openai_api_key=settings.openai_api_key
-        )
-    
-    # Tạo FAISS vectorstore từ embeddings đã có
-    # FAISS cần embedding function, nhưng ta muốn dùng precomputed embeddings
-    # Giải pháp: tạo custom Embeddings class trả về precomputed embeddings cho documents
-    # nhưng vẫn dùng embedding_model để embed queries mới
-    
-    class CustomEmbeddings(Embeddings):
-        """Custom embeddings class sử dụng precomputed embeddings cho documents."""
-        
-        def __init__(self, precomputed_embeddings: List[List[float]], query_embedding_model):
-            """
-            Args:
-                precomputed_embeddings: List of precomputed embedding vectors
-                query_embedding_model: Embedding model để embed queries mới
-            """
-            super().__init__()
-            self.precomputed_embeddings = precomputed_embeddings
-            self.query_embedding_model = query_embedding_model
-        
-        def embed_query(self, text: str) -> List[float]:
-            """Embed query text (sử dụng embedding model thực tế)."""
-            return self.query_embedding_model.embed_query(text)
-        
-        async def aembed_query(self, text: str) -> List[float]:
-            """Async embed query text."""
-            if hasattr(self.query_embedding_model, 'aembed_query'):
-                return await self.query_embedding_model.aembed_query(text)
-            else:
-                # Fallback to sync method
-                return self.query_embedding_model.embed_query(text)
-        
-        def embed_documents(self, texts: List[str]) -> List[List[float]]:
-            """Return precomputed embeddings (không tính lại)."""
-            # Return precomputed embeddings theo thứ tự texts
-            # Giả định texts có cùng thứ tự với precomputed_embeddings
-            return self.precomputed_embeddings
-        
-        async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
-            """Async embed documents (return precomputed embeddings)."""
-            return self.precomputed_embeddings
+        embedding_model = get_embedding_client()
     
-    # Tạo custom embeddings
-    custom_emb = CustomEmbeddings(embeddings_vectors, embedding_model)
-    
-    # Tạo FAISS vectorstore với custom embeddings
+    # Tạo FAISS vectorstore trực tiếp từ embeddings đã có (không tính lại),
+    # embedding_model chỉ dùng để embed queries mới
     try:
-        vectorstore = FAISS.from_documents(
-            documents=documents,
-            embedding=custom_emb
+        index = _build_faiss_index(np.asarray(embeddings_vectors, dtype=np.float32))
+        ids = [str(uuid.uuid4()) for _ in documents]
+        vectorstore = FAISS(
+            embedding_function=embedding_model,
+            index=index,
+            docstore=InMemoryDocstore(dict(zip(ids, documents))),
+            index_to_docstore_id=dict(enumerate(ids)),
         )
         
-        # Replace embedding attribute với embedding_model để FAISS có thể query
-        # FAISS sẽ dùng custom_emb.embed_documents khi tạo index (sử dụng precomputed)
-        # và dùng custom_emb.embed_query khi query (sử dụng embedding_model)
-        
-        logger.info(f"Đã tạo FAISS vectorstore với {len(documents)} documents")
+        logger.info(
+            f"Đã tạo FAISS vectorstore với {len(documents)} documents "
+            f"({type(index).__name__})"
+        )
         return vectorstore
         
     except Exception as e:
@@ -1,6 +1,7 @@
 """
 Helper functions để lấy và format schema information từ MongoDB cho SQL generation.
 """
+import hashlib
 import logging
 from typing import Optional, List, Dict, Any
 from langchain_core.documents import Document
@@ -97,7 +98,9 @@ async def get_table_schemas_from_retrieved_docs(
         schema_doc_id: ID của schema document (nếu None, sẽ lấy từ docs hoặc dùng mới nhất)
         
     Returns:
-        String chứa các CREATE TABLE statements, mỗi statement cách nhau bởi \n\n
+        String chứa các CREATE TABLE statements (sắp xếp theo schema, tên bảng), mỗi
+        statement cách nhau bởi \n\n, mở đầu bằng dòng comment schema version (hash nội dung).
+        Cùng tập bảng luôn cho ra cùng một chuỗi, không phụ thuộc thứ tự retrieve.
     """
     if not retrieved_docs:
         logger.warning("No retrieved docs provided")
@@ -124,8 +127,8 @@ async def get_table_schemas_from_retrieved_docs(
         key = (table.table_schema, table.table_name)
         table_lookup[key] = table
     
-    # Lấy table names từ retrieved_docs
-    table_schemas = []
+    # Lấy table names từ retrieved_docs: (table_schema, table_name) -> CREATE TABLE statement
+    table_schemas: Dict[tuple, str] = {}
     seen_tables = set()
     
     for doc in retrieved_docs:
@@ -151,7 +154,10 @@ async def get_table_schemas_from_retrieved_docs(
                 table_info, 
                 database_schema.database_type
             )
-            table_schemas.append(create_table_stmt)
+            # Chuẩn hoá xuống dòng và khoảng trắng cuối dòng để output ổn định
+            table_schemas[table_key] = "\n".join(
+                line.rstrip() for line in create_table_stmt.splitlines()
+            )
         else:
             logger.warning(
                 f"Table not found in schema: {table_schema_name}.{table_name} "
@@ -162,5 +168,10 @@ async def get_table_schemas_from_retrieved_docs(
         logger.warning("No table schemas found from retrieved_docs")
         return ""
     
-    return "\n\n".join(table_schemas)
+    body = "\n\n".join(
+        table_schemas[key]
+        for key in sorted(table_schemas, key=lambda k: (k[0] or "", k[1]))
+    )
+    version = hashlib.blake2b(body.encode(), digest_size=8).hexdigest()
+    return f"-- Schema version: {version}\n\n{body}"
 
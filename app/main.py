@@ -1,12 +1,16 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.core.database import connect_to_mongo, close_mongo_connection
+from app.core.http_client import close_openai_http_client
+from app.core.llm import get_chat_model
+from app.core.embeddings import clear_embedding_clients
 from app.core.sql_database import init_sql_connector, get_sql_connector
 from app.api.routes import api_router
 from app.graph.data_retriever import DataRetriever
 from app.graph.knowledge_base_retriever import KnowledgeBaseRetriever
-from app.graph import graph
+from app.graph import get_graph
 import logging
 
 # Configure logging
@@ -20,7 +24,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
-    debug=settings.debug
+    debug=settings.debug,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS middleware
@@ -82,7 +87,7 @@ async def startup_event():
         if data_retriever and data_retriever.data_vectorstore:
             logger.info("✓ SCHEMA EMBEDDINGS LOADED SUCCESSFULLY!")
             # Cập nhật graph instance với data_retriever
-            graph.data_retriever = data_retriever
+            get_graph().data_retriever = data_retriever
             logger.info("  - DataRetriever đã được khởi tạo và gắn vào Graph")
         else:
             logger.warning("⚠ Không thể load schema embeddings từ MongoDB")
@@ -101,7 +106,7 @@ async def startup_event():
         if kb_retriever and kb_retriever.kb_vectorstore:
             logger.info("✓ KNOWLEDGE BASE EMBEDDINGS LOADED SUCCESSFULLY!")
             # Cập nhật graph instance với kb_retriever
-            graph.kb_retriever = kb_retriever
+            get_graph().kb_retriever = kb_retriever
         else:
             logger.warning("⚠ Không thể load knowledge base embeddings từ MongoDB")
     except Exception as e:
@@ -118,6 +123,10 @@ async def startup_event():
 async def shutdown_event():
     """Close database connection on shutdown"""
     await close_mongo_connection()
+    await close_openai_http_client()
+    # Các client đã cache giữ tham chiếu tới http client vừa đóng: bỏ đi để không bị dùng lại
+    get_chat_model.cache_clear()
+    clear_embedding_clients()
     logger.info("Application shut down successfully")
 
 
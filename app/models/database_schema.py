@@ -46,6 +46,7 @@ class DatabaseSchema(BaseModel):
     tables: List[TableInfo] = []
     views: List[Dict[str, Any]] = []  # Views nếu có
     extracted_at: datetime = Field(default_factory=datetime.utcnow)
+    fingerprint: Optional[str] = None  # Hash cấu trúc schema, dùng để bỏ qua trích xuất lại
     metadata: Dict[str, Any] = {}  # Thông tin bổ sung
 
     class Config:
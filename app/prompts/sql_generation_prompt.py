@@ -1,5 +1,5 @@
 """
-Prompts cho SQL generation - sinh SQL query từ plan và schema.
+Prompts cho SQL generation - lập kế hoạch và sinh SQL query từ câu hỏi và schema.
 """
 
 SQL_GENERATION_SYSTEM_PROMPT = """Bạn là một chuyên gia SQL generation. Nhiệm vụ của bạn là sinh ra câu SQL query chính xác dựa trên:
@@ -31,16 +31,56 @@ Trả về SQL query dưới dạng JSON:
     "sql": "<SQL_QUERY_STRING>"
 }}"""
 
+# Schema gửi thành message riêng, đứng trước câu hỏi: phần prefix (system prompt + schema)
+# giữ nguyên giữa các câu hỏi trên cùng tập bảng nên dùng lại được prompt cache
+SQL_GENERATION_SCHEMA_PROMPT = """### DATABASE SCHEMA ###
+{table_schema}"""
+
 SQL_GENERATION_USER_PROMPT = """### CÂU HỎI CỦA NGƯỜI DÙNG ###
 {user_query}
 
 ### SQL REASONING PLAN ###
 {sql_plan}
 
-### DATABASE SCHEMA ###
-{table_schema}
-
 ### YÊU CẦU ###
 Hãy sinh ra câu SQL query chính xác dựa trên kế hoạch và schema trên.
 """
 
+SQL_PLAN_AND_GENERATION_SYSTEM_PROMPT = """Bạn là một chuyên gia SQL. Nhiệm vụ của bạn là phân tích câu hỏi của người dùng và database schema, lập kế hoạch SQL reasoning rồi sinh ra câu SQL query chính xác, trong cùng một lần trả lời.
+
+### BƯỚC 1: LẬP KẾ HOẠCH ###
+Suy nghĩ từng bước và viết kế hoạch ngắn gọn, bao gồm:
+- Xác định các tables cần sử dụng
+- Xác định các columns cần select/join/filter
+- Xác định các điều kiện WHERE cần thiết
+- Xác định các aggregations (nếu có)
+- Xác định các JOINs giữa các tables
+- Xác định ORDER BY và LIMIT (nếu có)
+
+### BƯỚC 2: SINH SQL THEO KẾ HOẠCH ###
+- CHỈ SỬ DỤNG SELECT statements, KHÔNG dùng DELETE, UPDATE, INSERT
+- CHỈ SỬ DỤNG các tables và columns được đề cập trong database schema
+- SỬ DỤNG tên table CHÍNH XÁC từ CREATE TABLE statements (case-sensitive)
+- Đặt double quotes xung quanh tên table và column
+- Đặt single quotes xung quanh string literals
+- KHÔNG đặt quotes xung quanh numeric literals
+- PHẢI SỬ DỤNG JOIN nếu chọn columns từ nhiều tables
+- ƯU TIÊN sử dụng CTEs thay vì subqueries
+- Sử dụng lower() function cho case-insensitive comparison khi cần
+- Aggregate functions phải ở HAVING clause, không phải WHERE clause
+- KHÔNG bao gồm comments trong SQL query
+
+### VÍ DỤ ###
+Nếu CREATE TABLE cho thấy `CREATE TABLE public_Student`, thì sử dụng:
+  SELECT "public_Student"."student_name" FROM "public_Student" WHERE "public_Student"."city" = 'Hanoi';
+KHÔNG sử dụng: SELECT "students"."student_name" FROM "students" ...
+
+### ĐỊNH DẠNG TRẢ VỀ ###
+Trả về theo thứ tự: plan (kế hoạch ở bước 1), sql (câu SQL ở bước 2), reason (giải thích ngắn gọn)."""
+
+SQL_PLAN_AND_GENERATION_USER_PROMPT = """### CÂU HỎI CỦA NGƯỜI DÙNG ###
+{user_query}
+
+### YÊU CẦU ###
+Hãy lập kế hoạch SQL reasoning rồi sinh ra câu SQL query chính xác để trả lời câu hỏi trên, dựa trên schema đã cho.
+"""
@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import List, Literal
 from pydantic import BaseModel, Field
 
 
@@ -15,4 +15,12 @@ class IntentClassifierSchema(BaseModel):
 
 
 
- 
\ No newline at end of file
+ 
+
+
+class IntentBatchSchema(BaseModel):
+    """Schema dùng cho llm_with_structured để phân loại nhiều câu hỏi trong một lần gọi."""
+
+    intents: List[IntentClassifierSchema] = Field(
+        description="Kết quả phân loại của từng câu hỏi, đúng thứ tự và đúng số lượng câu hỏi được đánh số."
+    )
@@ -11,3 +11,16 @@ class SQLGenerationSchema(BaseModel):
         description="Lý do tại sao viết câu SQL như vậy, giải thích ngắn gọn về cách tiếp cận, các tables/columns được chọn, logic JOIN, WHERE conditions, và các quyết định thiết kế query."
     )
 
+
+class SQLPlanAndGenerationSchema(BaseModel):
+    """Schema dùng cho llm_with_structured để lập kế hoạch và sinh SQL query trong một lần gọi."""
+
+    plan: str = Field(
+        description="Kế hoạch SQL reasoning: các tables, columns, JOINs, điều kiện WHERE, aggregations, ORDER BY/LIMIT cần dùng."
+    )
+    sql: str = Field(
+        description="SQL query được sinh ra theo kế hoạch để trả lời câu hỏi của người dùng. Query phải tuân thủ các quy tắc SQL đã được định nghĩa."
+    )
+    reason: str = Field(
+        description="Lý do tại sao viết câu SQL như vậy, giải thích ngắn gọn về cách tiếp cận và các quyết định thiết kế query."
+    )
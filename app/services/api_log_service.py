@@ -1,6 +1,8 @@
+import copy
 from typing import Optional, Dict, Any, List
 
 from bson import ObjectId
+from app.core.cache import TTLCache
 from app.core.database import get_database
 from app.models.log import ApiLog
 import logging
@@ -16,6 +18,10 @@ class ApiLogService:
     Quản lý các log của API requests riêng biệt với chat sessions.
     """
 
+    def __init__(self):
+        # API log không bị sửa sau khi ghi nên có thể cache get_by_id
+        self._by_id_cache = TTLCache(maxsize=1024, ttl=30)
+
     @property
     def collection(self):
         db = get_database()
@@ -66,12 +72,17 @@ class ApiLogService:
             return ""
 
     async def get_by_id(self, log_id: str) -> Optional[Dict[str, Any]]:
-        """Lấy API log theo id document."""
+        """Lấy API log theo id document (bản copy riêng, caller sửa không ảnh hưởng cache)."""
+        cached = self._by_id_cache.get(log_id)
+        if cached is not None:
+            return copy.deepcopy(cached)
         try:
             doc = await self.collection.find_one({"_id": ObjectId(log_id)})
             if doc:
                 doc["id"] = str(doc["_id"])
                 del doc["_id"]
+                self._by_id_cache.set(log_id, doc)
+                return copy.deepcopy(doc)
             return doc
         except Exception as e:
             logger.error(f"Error getting API log by id: {e}")
@@ -87,12 +98,13 @@ class ApiLogService:
                 .sort("created_at", -1)
                 .skip(skip)
                 .limit(limit)
+                # Lấy cả trang trong một batch (không cần thêm getMore)
+                .batch_size(limit)
             )
-            results = []
-            async for doc in cursor:
+            results = await cursor.to_list(length=limit or None)
+            for doc in results:
                 doc["id"] = str(doc["_id"])
                 del doc["_id"]
-                results.append(doc)
             return results
         except Exception as e:
             logger.error(f"Error getting all API logs: {e}")
@@ -108,12 +120,13 @@ class ApiLogService:
                 .sort("created_at", -1)
                 .skip(skip)
                 .limit(limit)
+                # Lấy cả trang trong một batch (không cần thêm getMore)
+                .batch_size(limit)
             )
-            results = []
-            async for doc in cursor:
+            results = await cursor.to_list(length=limit or None)
+            for doc in results:
                 doc["id"] = str(doc["_id"])
                 del doc["_id"]
-                results.append(doc)
             return results
         except Exception as e:
             logger.error(f"Error getting API logs by path: {e}")
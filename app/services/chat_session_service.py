@@ -1,7 +1,9 @@
+import copy
 from typing import List, Optional, Dict, Any
 
 from bson import ObjectId
 
+from app.core.cache import TTLCache
 from app.core.database import get_database
 from app.models.chat_session import ChatSession, TokenUsage, ChatMessage
 import logging
@@ -17,6 +19,14 @@ class ChatSessionService:
     Quản lý các session chat: 1 document / 1 session_id.
     """
 
+    def __init__(self):
+        # Cache get_by_id (key: id document), invalidate khi session được ghi
+        self._by_id_cache = TTLCache(maxsize=1024, ttl=30)
+        # id -> [số lần invalidate, số get_by_id đang đọc Mongo]; chỉ giữ khi có read đang chạy.
+        # get_by_id có await giữa cache miss và set: nếu session bị invalidate trong lúc đó,
+        # document vừa đọc có thể là bản cũ nên không được đưa vào cache
+        self._inflight_reads: Dict[str, List[int]] = {}
+
     @property
     def collection(self):
         """Lazy-load collection to avoid initialization issues"""
@@ -32,6 +42,7 @@ class ChatSessionService:
         try:
             session_dict = session.model_dump(exclude={"id"})
             result = await self.collection.insert_one(session_dict)
+            self._invalidate(str(result.inserted_id))
             return str(result.inserted_id)
         except Exception as e:
             logger.error(f"Error creating chat session: {e}")
@@ -109,18 +120,41 @@ class ChatSessionService:
 
             # Lấy lại document để trả về id
             doc = await self.collection.find_one({"session_id": session_id})
+            if doc:
+                self._invalidate(str(doc["_id"]))
             return str(doc["_id"]) if doc else ""
         except Exception as e:
             logger.error(f"Error appending interaction to session: {e}")
             raise
 
+    def _invalidate(self, doc_id: str) -> None:
+        """Bỏ session khỏi cache và đánh dấu các get_by_id đang đọc id này là cũ."""
+        self._by_id_cache.pop(doc_id)
+        read = self._inflight_reads.get(doc_id)
+        if read is not None:
+            read[0] += 1
+
     async def get_by_id(self, session_id: str) -> Optional[Dict[str, Any]]:
-        """Lấy session theo id document."""
+        """Lấy session theo id document (bản copy riêng, caller sửa không ảnh hưởng cache)."""
+        cached = self._by_id_cache.get(session_id)
+        if cached is not None:
+            return copy.deepcopy(cached)
         try:
-            doc = await self.collection.find_one({"_id": ObjectId(session_id)})
+            read = self._inflight_reads.setdefault(session_id, [0, 0])
+            version = read[0]
+            read[1] += 1
+            try:
+                doc = await self.collection.find_one({"_id": ObjectId(session_id)})
+            finally:
+                read[1] -= 1
+                if read[1] == 0:
+                    del self._inflight_reads[session_id]
             if doc:
                 doc["id"] = str(doc["_id"])
                 del doc["_id"]
+                if read[0] == version:
+                    self._by_id_cache.set(session_id, doc)
+                return copy.deepcopy(doc)
             return doc
         except Exception as e:
             logger.error(f"Error getting chat session by id: {e}")
@@ -148,12 +182,13 @@ class ChatSessionService:
                 .sort("created_at", -1)
                 .skip(skip)
                 .limit(limit)
+                # Lấy cả trang trong một batch (không cần thêm getMore)
+                .batch_size(limit)
             )
-            results = []
-            async for doc in cursor:
+            results = await cursor.to_list(length=limit or None)
+            for doc in results:
                 doc["id"] = str(doc["_id"])
                 del doc["_id"]
-                results.append(doc)
             return results
         except Exception as e:
             logger.error(f"Error getting all chat sessions: {e}")
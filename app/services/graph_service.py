@@ -2,9 +2,15 @@ from typing import Dict, Any, List, Optional
 import logging
 
 from langchain_core.documents import Document
-from app.graph import Graph, GraphState, graph
+from app.core.llm import DEFAULT_CHAT_MODEL
+from app.graph import Graph, GraphState, get_graph
 from app.services.chat_session_service import chat_session_service
 
+try:
+    from langchain_community.callbacks.openai_info import OpenAICallbackHandler
+except ImportError:
+    from langchain.callbacks.openai_info import OpenAICallbackHandler
+
 logger = logging.getLogger(__name__)
 
 
@@ -25,6 +31,8 @@ class GraphService:
             suggested_actions=[],
             token_usage={},
             retrieved_docs=[],  # Kết quả truy vấn từ data retriever
+            table_schema="",
+            sql_cache_hit=False,
             sql_plan="",
             sql_query="",
             sql_reason="",
@@ -52,8 +60,21 @@ class GraphService:
         """
         try:
             state = self._empty_state(query=message)
-            # Dùng graph đã compile để chạy toàn bộ workflow
-            final_state = await graph.graph.ainvoke(state)
+            # Dùng graph đã compile để chạy toàn bộ workflow.
+            # Một callback handler cho cả lượt chạy: cộng dồn token của mọi lần gọi LLM trong các node
+            # (trừ lần gọi classify_many của IntentBatcher khi gom nhiều query: lần gọi đó phục vụ
+            # nhiều request nên token của nó không được tính vào token_usage của request nào)
+            token_handler = OpenAICallbackHandler()
+            final_state = await get_graph().graph.ainvoke(
+                state, config={"callbacks": [token_handler]}
+            )
+            final_state["token_usage"] = {
+                "prompt_tokens": token_handler.prompt_tokens,
+                "completion_tokens": token_handler.completion_tokens,
+                "total_tokens": token_handler.total_tokens,
+                "model": DEFAULT_CHAT_MODEL,
+                "cost": token_handler.total_cost,
+            }
             intent = final_state.get("intent", "out_of_scope")
 
             logger.info(f"[GraphService] intent={intent!r} for query={message[:80]!r}")
@@ -67,7 +88,7 @@ class GraphService:
                         response=f"[intent_classification] intent={intent}",
                         context=None,
                         knowledge_base_refs=None,
-                        token_usage_delta=None,  # POC: chưa lấy token usage chi tiết
+                        token_usage_delta=final_state["token_usage"],
                         metadata={"source": "graph_service.classify_intent"},
                     )
                     logger.info(f"[GraphService] Logged interaction for session {session_id}")
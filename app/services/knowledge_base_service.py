@@ -5,7 +5,7 @@ Service để xử lý knowledge base:
 """
 import logging
 import asyncio
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, BinaryIO, Tuple
 from datetime import datetime
 from bson import ObjectId
 
@@ -13,11 +13,17 @@ from langchain_openai import OpenAIEmbeddings
 from langchain_core.documents import Document
 
 from app.core.database import get_database
-from app.core.config import settings
+from app.core.embeddings import get_embedding_client
 from app.models.knowledge_base import KnowledgeBaseDocument, KnowledgeBaseChunkEmbedding
 
 logger = logging.getLogger(__name__)
 
+# Số chunks trong một request embedding
+EMBEDDING_BATCH_SIZE = 64
+
+# Số request embedding chạy song song
+EMBEDDING_CONCURRENCY = 8
+
 
 async def create_embeddings_for_chunks(
     chunks: List[Document],
@@ -29,7 +35,7 @@ async def create_embeddings_for_chunks(
     
     Args:
         chunks: List LangChain Document objects (đã có metadata đầy đủ)
-        embedding_model_instance: OpenAIEmbeddings instance (nếu None, sẽ tạo mới)
+        embedding_model_instance: OpenAIEmbeddings instance (nếu None, dùng client dùng chung)
         embedding_model_name: Tên embedding model
         
     Returns:
@@ -39,61 +45,71 @@ async def create_embeddings_for_chunks(
         logger.warning("Empty chunks list provided for embedding")
         return []
     
-    # Khởi tạo embedding model nếu chưa có
+    # Dùng embedding model dùng chung nếu chưa có
     if embedding_model_instance is None:
-        embedding_model_instance = OpenAIEmbeddings(
-            model=embedding_model_name,
-            openai_api_key=settings.openai_api_key,
-        )
+        embedding_model_instance = get_embedding_client(embedding_model_name)
+    
+    # Lọc các chunk hợp lệ (giữ thứ tự theo chunk_index)
+    valid_chunks = []
+    for idx, chunk_doc in enumerate(chunks):
+        chunk_metadata = chunk_doc.metadata or {}
+        if not chunk_metadata.get("document_id") or not chunk_metadata.get("source_id"):
+            logger.warning(
+                f"Chunk {idx} missing document_id or source_id, skipping"
+            )
+            continue
+        valid_chunks.append((idx, chunk_doc))
+    
+    batches = [
+        valid_chunks[start:start + EMBEDDING_BATCH_SIZE]
+        for start in range(0, len(valid_chunks), EMBEDDING_BATCH_SIZE)
+    ]
+    
+    # Embed theo batch, các batch chạy song song (giới hạn bởi semaphore)
+    semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+    
+    async def _embed_batch(batch: List[Tuple[int, Document]]) -> List[List[float]]:
+        texts = [chunk_doc.page_content for _, chunk_doc in batch]
+        async with semaphore:
+            if hasattr(embedding_model_instance, 'aembed_documents'):
+                return await embedding_model_instance.aembed_documents(texts)
+            # Fallback to sync method in thread
+            return await asyncio.to_thread(embedding_model_instance.embed_documents, texts)
+    
+    results = await asyncio.gather(
+        *[_embed_batch(batch) for batch in batches],
+        return_exceptions=True,
+    )
     
     embeddings = []
     
-    for idx, chunk_doc in enumerate(chunks):
-        try:
-            chunk_text = chunk_doc.page_content
-            chunk_metadata = chunk_doc.metadata or {}
-            
-            # Lấy thông tin từ metadata
-            document_id = chunk_metadata.get("document_id", "")
-            source_id = chunk_metadata.get("source_id", "")
-            chunk_index = chunk_metadata.get("chunk_index", idx)
-            
-            if not document_id or not source_id:
-                logger.warning(
-                    f"Chunk {idx} missing document_id or source_id, skipping"
-                )
-                continue
-            
-            # Tạo embedding vector
+    for batch, result in zip(batches, results):
+        if isinstance(result, Exception):
+            logger.error(
+                f"Error creating embeddings for chunks {batch[0][0]}-{batch[-1][0]}: {result}"
+            )
+            continue
+        
+        for (idx, chunk_doc), embedding_vector in zip(batch, result):
             try:
-                if hasattr(embedding_model_instance, 'aembed_query'):
-                    embedding_vector = await embedding_model_instance.aembed_query(chunk_text)
-                else:
-                    # Fallback to sync method in thread
-                    embedding_vector = await asyncio.to_thread(
-                        embedding_model_instance.embed_query,
-                        chunk_text
-                    )
+                chunk_metadata = chunk_doc.metadata or {}
+                
+                # Tạo KnowledgeBaseChunkEmbedding
+                chunk_embedding = KnowledgeBaseChunkEmbedding(
+                    document_id=chunk_metadata["document_id"],
+                    source_id=chunk_metadata["source_id"],
+                    chunk_index=chunk_metadata.get("chunk_index", idx),
+                    text=chunk_doc.page_content,
+                    embedding_vector=embedding_vector,
+                    embedding_model=embedding_model_name,
+                    metadata=chunk_metadata,
+                )
+                
+                embeddings.append(chunk_embedding)
+                
             except Exception as e:
-                logger.error(f"Error creating embedding for chunk {idx}: {e}")
+                logger.error(f"Error processing chunk {idx}: {e}", exc_info=True)
                 continue
-            
-            # Tạo KnowledgeBaseChunkEmbedding
-            chunk_embedding = KnowledgeBaseChunkEmbedding(
-                document_id=document_id,
-                source_id=source_id,
-                chunk_index=chunk_index,
-                text=chunk_text,
-                embedding_vector=embedding_vector,
-                embedding_model=embedding_model_name,
-                metadata=chunk_metadata,
-            )
-            
-            embeddings.append(chunk_embedding)
-            
-        except Exception as e:
-            logger.error(f"Error processing chunk {idx}: {e}", exc_info=True)
-            continue
     
     logger.info(f"Created {len(embeddings)} embeddings from {len(chunks)} chunks")
     
@@ -177,7 +193,7 @@ async def save_knowledge_base_chunk_embeddings(
 
 
 async def process_and_save_docx_file(
-    file_content: bytes,
+    file_obj: BinaryIO,
     filename: str,
     source_id: Optional[str] = None,
     title: Optional[str] = None,
@@ -193,7 +209,7 @@ async def process_and_save_docx_file(
     4. Lưu KnowledgeBaseDocument và KnowledgeBaseChunkEmbedding vào MongoDB
     
     Args:
-        file_content: Bytes content của file DOCX
+        file_obj: File object (binary, seekable) chứa nội dung DOCX
         filename: Tên file
         source_id: Source ID (nếu None, sẽ tự generate từ filename)
         title: Tiêu đề document (optional)
@@ -209,7 +225,7 @@ async def process_and_save_docx_file(
             - embedding_ids: List IDs của embeddings đã lưu
     """
     from app.core.knowledge_base_utils import (
-        load_docx_from_bytes,
+        load_docx_from_file_obj,
         split_documents_into_chunks,
         prepare_chunks_for_embedding,
     )
@@ -222,14 +238,17 @@ async def process_and_save_docx_file(
     try:
         # Bước 1: Load DOCX và convert sang Markdown
         logger.info(f"Loading DOCX file: {filename}")
-        documents = load_docx_from_bytes(file_content, filename)
+        # Đọc DOCX + convert Markdown là CPU-bound: chạy trong worker thread để không chặn event loop
+        documents = await asyncio.to_thread(load_docx_from_file_obj, file_obj, filename)
         
         if not documents:
             raise ValueError(f"Không thể load nội dung từ file {filename}")
         
         # Bước 2: Split thành chunks với table awareness
         logger.info(f"Splitting {len(documents)} documents into chunks...")
-        chunked_docs = split_documents_into_chunks(
+        # Split cũng là CPU-bound: chạy trong worker thread như bước load
+        chunked_docs = await asyncio.to_thread(
+            split_documents_into_chunks,
             documents,
             metadata=metadata,
             use_markdown_splitting=True,
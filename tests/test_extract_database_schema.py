@@ -0,0 +1,58 @@
+"""
+Test trích xuất schema với include_tables trên database thật.
+
+Dùng cấu hình kết nối POSTGRES_* / MYSQL_* giống app; bỏ qua nếu không có
+hoặc không kết nối được database tương ứng.
+"""
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.core.extract_database_schema import extract_mysql_schema, extract_postgres_schema
+from app.core.sql_database import create_sql_connector
+
+
+EXTRACTORS = {
+    "postgres": extract_postgres_schema,
+    "mysql": extract_mysql_schema,
+}
+
+
+def _connector_or_skip(db_type: str):
+    try:
+        connector = create_sql_connector(db_type)
+    except Exception as e:
+        pytest.skip(f"Không kết nối được {db_type}: {e}")
+    if connector is None:
+        pytest.skip(f"Chưa cấu hình {db_type}")
+    return connector
+
+
+@pytest.mark.parametrize("db_type", sorted(EXTRACTORS))
+def test_include_tables_filters_views(db_type):
+    connector = _connector_or_skip(db_type)
+    suffix = uuid.uuid4().hex[:8]
+    table_name = f"kb_test_orders_{suffix}"
+    view_in = f"kb_test_orders_view_{suffix}"
+    view_out = f"kb_test_other_view_{suffix}"
+
+    engine = create_engine(connector.db_uri)
+    with engine.begin() as connection:
+        connection.execute(text(f"CREATE TABLE {table_name} (id INTEGER PRIMARY KEY, amount INTEGER)"))
+        connection.execute(text(f"CREATE VIEW {view_in} AS SELECT id, amount FROM {table_name}"))
+        connection.execute(text(f"CREATE VIEW {view_out} AS SELECT id FROM {table_name}"))
+    try:
+        schema = asyncio.run(
+            EXTRACTORS[db_type](connector, include_tables=[table_name, view_in])
+        )
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP VIEW {view_out}"))
+            connection.execute(text(f"DROP VIEW {view_in}"))
+            connection.execute(text(f"DROP TABLE {table_name}"))
+        engine.dispose()
+
+    assert [table["table_name"] for table in schema["tables"]] == [table_name]
+    assert [view["name"] for view in schema["views"]] == [view_in]
@@ -0,0 +1,38 @@
+"""
+Test split markdown khi nhiều upload chạy song song (split chạy trong worker thread).
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.documents import Document
+
+from app.core import knowledge_base_utils
+from app.core.cache import TTLCache
+
+
+def _make_document(i: int) -> Document:
+    return Document(
+        page_content=f"# Chương {i}\n\nNội dung chương {i}.\n\n## Mục {i}.1\n\nChi tiết mục {i}.1.\n",
+        metadata={"source": f"doc-{i}.docx"},
+    )
+
+
+def test_split_from_threads_keeps_header_sections(monkeypatch, caplog):
+    # Cache nhỏ để các thread liên tục evict entry của nhau
+    monkeypatch.setattr(knowledge_base_utils, "_header_split_cache", TTLCache(maxsize=4, ttl=3600))
+    documents = [_make_document(i) for i in range(200)]
+
+    def split(i: int):
+        return knowledge_base_utils.split_markdown_with_table_awareness([documents[i]])
+
+    with caplog.at_level(logging.WARNING, logger=knowledge_base_utils.__name__):
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(split, [i % len(documents) for i in range(2000)]))
+
+    assert "Header splitting failed" not in caplog.text
+    for n, chunks in enumerate(results):
+        i = n % len(documents)
+        assert len(chunks) == 2
+        assert chunks[0].metadata["Header 1"] == f"Chương {i}"
+        assert chunks[1].metadata["Header 2"] == f"Mục {i}.1"
+        assert all(chunk.metadata["source"] == f"doc-{i}.docx" for chunk in chunks)